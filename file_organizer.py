@@ -1,10 +1,88 @@
 import os
-import json
-import shutil
-from datetime import datetime
+import queue
 import tkinter as tk
-from tkinter import filedialog, ttk
-from pathlib import Path
+from tkinter import filedialog, messagebox, ttk
+
+from organizer_config import CONFIG_FILE, ConfigError, ConfigStore
+from organizer_dirs import COLLISION_POLICIES, RESTORE_POLICY
+from organizer_engine import DEFAULT_GROUPS, OrganizerEngine
+from organizer_journal import (MoveJournal, default_journal_path, prune_folders,
+                               undo_moves)
+from organizer_log import StatusLog, default_log_path
+from organizer_worker import OrganizeWorker
+
+# How often (ms) worker progress is drained into the status area: 10 Hz
+STATUS_POLL_MS = 100
+# Cap on messages taken per drain so a burst cannot stall the UI; only the
+# visible rows are rendered, so this can be generous
+STATUS_BATCH_LIMIT = 5000
+STATUS_ROWS = 6
+# How often (ms) the config file is checked for outside edits
+CONFIG_POLL_MS = 2000
+MOVE_WORKERS = 4
+
+
+class StatusLogView:
+    """Read-only view of a StatusLog that renders only the visible rows.
+
+    The Text widget never holds more than ``rows`` lines; scrolling and new
+    messages re-render that window from the log, so the cost of an update
+    does not depend on how many lines the run has produced. The view follows
+    the newest line until the user scrolls up.
+    """
+
+    def __init__(self, parent, log, rows=STATUS_ROWS, **text_options):
+        self.log = log
+        self.rows = rows
+        # Absolute number (see StatusLog.total) of the first visible line
+        self.top = 0
+        self.follow = True
+        self._shown = None
+        self.text = tk.Text(parent, height=rows, wrap='none', state='disabled',
+                            **text_options)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.on_scroll)
+        self.text.bind('<MouseWheel>',
+                       lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.text.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda e: self.scroll(3))
+
+    def grid(self, row, column):
+        self.text.grid(row=row, column=column, sticky="ew")
+        self.scrollbar.grid(row=row, column=column + 1, sticky="ns")
+
+    def refresh(self):
+        size = len(self.log)
+        first = self.log.total - size
+        last_top = first + max(0, size - self.rows)
+        if self.follow:
+            self.top = last_top
+        self.top = min(max(self.top, first), last_top)
+        shown = (self.log.total, size, self.top)
+        if shown == self._shown:
+            return
+        self._shown = shown
+        self.text.configure(state='normal')
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', '\n'.join(self.log.lines(self.top - first, self.rows)))
+        self.text.configure(state='disabled')
+        if size:
+            start = (self.top - first) / size
+            self.scrollbar.set(start, start + min(self.rows, size) / size)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, lines):
+        self.top += lines
+        self.follow = self.top >= self.log.total - self.rows
+        self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            first = self.log.total - len(self.log)
+            self.scroll(first + int(float(amount) * len(self.log)) - self.top)
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.rows if unit == "pages" else 1))
+
 
 class FileOrganizerApp:
     def __init__(self, root):
@@ -16,19 +94,23 @@ class FileOrganizerApp:
         self.root.tk.call('tk', 'scaling', 1.7)  # Better scaling for Retina displays
         
         # Default groups (same as before)
-        self.default_groups = {
-            "Documents": ["pdf", "doc", "docx", "txt", "rtf", "odt"],
-            "Images": ["jpg", "jpeg", "png", "gif", "bmp", "tiff"],
-            "Videos": ["mp4", "avi", "mkv", "mov", "wmv"],
-            "Audio": ["mp3", "wav", "flac", "m4a", "aac"],
-            "Archives": ["zip", "rar", "7z", "tar", "gz"],
-            "Code": ["py", "java", "cpp", "html", "css", "js"]
-        }
-        
-        # Load saved settings
-        self.config_file = "organizer_config.json"
+        self.default_groups = DEFAULT_GROUPS
+        
+        # Load saved settings; saves are debounced and written in the background
+        self.config_file = CONFIG_FILE
+        self.config_store = ConfigStore(self.config_file)
         self.extension_groups = self.load_config()
         
+        # The engine does the actual sorting; it shares our config dict
+        self.engine = OrganizerEngine()
+        config_error = self.apply_config()
+        config_error = self.config_store.load_error or config_error
+        self.worker = None
+        self.journal = None
+        self.undoing = None
+        # Bounded in memory; the full history goes to the rotating log file
+        self.status_log = StatusLog(path=default_log_path())
+        
         # Style configuration for Mac look
         self.style = ttk.Style()
         self.style.configure('TLabel', font=('SF Pro Text', 13))
@@ -47,6 +129,9 @@ class FileOrganizerApp:
         self.main_container.columnconfigure(0, weight=1)
         
         self.create_mac_ui()
+        if config_error is not None:
+            self.update_status(f"Ignoring invalid settings in {self.config_file}: {str(config_error)}")
+        self.root.after(CONFIG_POLL_MS, self.poll_config)
     
     def create_mac_ui(self):
         # Source Selection - Mac style
@@ -136,11 +221,40 @@ class FileOrganizerApp:
                        variable=self.org_method, 
                        value="date").grid(row=2, column=0, 
                        sticky="w", padx=20)
+        ttk.Radiobutton(options_frame, text="By Date, then File Type", 
+                       variable=self.org_method, 
+                       value="date-group").grid(row=3, column=0, 
+                       sticky="w", padx=20)
         
         # Primary Action Button - Mac style
-        organize_btn = ttk.Button(options_frame, text="Organize Files",
-                               command=self.organize_files)
-        organize_btn.grid(row=3, column=0, sticky="w", padx=20, pady=(20, 0))
+        conflict_frame = ttk.Frame(options_frame)
+        conflict_frame.grid(row=4, column=0, sticky="w", padx=20, pady=(10, 0))
+        
+        ttk.Label(conflict_frame, text="If a file already exists:").grid(
+            row=0, column=0, padx=(0, 8))
+        self.collision_policy = tk.StringVar(value="rename")
+        ttk.Combobox(conflict_frame, textvariable=self.collision_policy,
+                     values=COLLISION_POLICIES, width=16,
+                     state="readonly").grid(row=0, column=1)
+        
+        run_frame = ttk.Frame(options_frame)
+        run_frame.grid(row=5, column=0, sticky="w", padx=20, pady=(20, 0))
+        
+        self.organize_btn = ttk.Button(run_frame, text="Organize Files",
+                                    command=self.organize_files)
+        self.organize_btn.grid(row=0, column=0, padx=(0, 8))
+        
+        self.pause_btn = ttk.Button(run_frame, text="Pause",
+                                 command=self.toggle_pause, state="disabled")
+        self.pause_btn.grid(row=0, column=1, padx=(0, 8))
+        
+        self.cancel_btn = ttk.Button(run_frame, text="Cancel",
+                                  command=self.cancel_organize, state="disabled")
+        self.cancel_btn.grid(row=0, column=2, padx=(0, 8))
+        
+        self.undo_btn = ttk.Button(run_frame, text="Undo Last Run",
+                                command=self.undo_last_run)
+        self.undo_btn.grid(row=0, column=3)
         
         # Status Area - Mac style
         ttk.Label(self.main_container, text="Status", 
@@ -151,15 +265,9 @@ class FileOrganizerApp:
         status_frame.grid(row=9, column=0, sticky="ew")
         status_frame.columnconfigure(0, weight=1)
         
-        self.status_text = tk.Text(status_frame, height=6, width=50,
-                                font=('SF Mono', 13), wrap='word',
-                                background='#F5F5F5')
-        self.status_text.grid(row=0, column=0, sticky="ew")
-        
-        scrollbar = ttk.Scrollbar(status_frame, orient="vertical",
-                               command=self.status_text.yview)
-        scrollbar.grid(row=0, column=1, sticky="ns")
-        self.status_text.configure(yscrollcommand=scrollbar.set)
+        self.status_view = StatusLogView(status_frame, self.status_log, width=50,
+                                         font=('SF Mono', 13), background='#F5F5F5')
+        self.status_view.grid(row=0, column=0)
         
         self.update_groups_display()
         
@@ -242,27 +350,65 @@ class FileOrganizerApp:
             if "groups" not in self.extension_groups:
                 self.extension_groups["groups"] = {}
             self.extension_groups["groups"][selected] = self.default_groups[selected]
+            self.engine.rebuild_index()
             self.save_config()
             self.update_groups_display()
             self.update_status(f"Added predefined group: {selected}")
     
     def load_config(self):
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
-            return {"groups": {}, "last_path": ""}
-        except Exception as e:
-            return {"groups": {}, "last_path": ""}
+        return self.config_store.data
     
     def save_config(self):
         try:
             self.extension_groups["last_path"] = self.folder_path.get()
-            with open(self.config_file, 'w') as f:
-                json.dump(self.extension_groups, f, indent=4)
+            try:
+                self.config_store.save()
+            except ConfigError as e:
+                # The file on disk failed to load; only replace it if asked to
+                if not messagebox.askyesno(
+                        "Replace settings?",
+                        f"{str(e)}.\n\nReplace it with the current settings? "
+                        "Choose No to fix the file by hand; it is reloaded "
+                        "when it changes."):
+                    self.update_status(f"Settings not saved: {str(e)}")
+                    return
+                self.config_store.save(force=True)
         except Exception as e:
             self.update_status(f"Error saving configuration: {str(e)}")
     
+    def apply_config(self):
+        """Point the engine at the current config; returns the error, if any"""
+        self.engine.config = self.extension_groups
+        try:
+            self.engine.rebuild_index()
+            return None
+        except ValueError as e:
+            # Keep the app usable without the broken rules or date settings;
+            # the groups dict stays shared so group edits still apply
+            self.extension_groups.setdefault("groups", {})
+            self.engine.config = dict(self.extension_groups, rules=[], dates={})
+            self.engine.rebuild_index()
+            return e
+    
+    def poll_config(self):
+        """Pick up outside edits to the config file and report failed saves"""
+        if self.config_store.save_error is not None:
+            self.update_status(f"Error saving configuration: {str(self.config_store.save_error)}")
+            self.config_store.save_error = None
+        # Never swap the rules under a running organize
+        if self.worker is None or not self.worker.is_alive():
+            try:
+                if self.config_store.reload_if_changed():
+                    error = self.apply_config()
+                    self.folder_path.set(self.extension_groups.get("last_path", ""))
+                    self.update_groups_display()
+                    if error is not None:
+                        raise error
+                    self.update_status(f"Reloaded {self.config_file}")
+            except (OSError, ValueError) as e:
+                self.update_status(f"Ignoring invalid settings in {self.config_file}: {str(e)}")
+        self.root.after(CONFIG_POLL_MS, self.poll_config)
+    
     def update_groups_display(self):
         self.groups_text.delete(1.0, tk.END)
         for group, extensions in self.extension_groups.get("groups", {}).items():
@@ -276,6 +422,7 @@ class FileOrganizerApp:
             if "groups" not in self.extension_groups:
                 self.extension_groups["groups"] = {}
             self.extension_groups["groups"][group_name] = extensions
+            self.engine.rebuild_index()
             self.save_config()
             self.update_groups_display()
             self.new_group_name.set("")
@@ -289,70 +436,131 @@ class FileOrganizerApp:
             self.save_config()
     
     def update_status(self, message):
-        self.status_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
-        self.status_text.see(tk.END)
-        self.root.update()
-    
-    def get_group_for_extension(self, extension):
-        extension = extension.lower()
-        for group, extensions in self.extension_groups.get("groups", {}).items():
-            if extension in extensions:
-                return group
-        return extension.upper()
-    
-    def organize_by_extension(self, folder_path):
-        for file_path in Path(folder_path).glob('*.*'):
-            if file_path.is_file():
-                extension = file_path.suffix[1:].lower()
-                group_name = self.get_group_for_extension(extension)
-                
-                new_folder = Path(folder_path) / group_name
-                new_folder.mkdir(exist_ok=True)
-                
-                try:
-                    shutil.move(str(file_path), str(new_folder / file_path.name))
-                    self.update_status(f"Moved {file_path.name} to {group_name} folder")
-                except Exception as e:
-                    self.update_status(f"Error moving {file_path.name}: {str(e)}")
-    
-    def organize_by_date(self, folder_path):
-        for file_path in Path(folder_path).glob('*.*'):
-            if file_path.is_file():
-                timestamp = file_path.stat().st_mtime
-                date = datetime.fromtimestamp(timestamp)
-                folder_name = date.strftime('%Y-%m')
-                
-                new_folder = Path(folder_path) / folder_name
-                new_folder.mkdir(exist_ok=True)
-                
-                try:
-                    shutil.move(str(file_path), str(new_folder / file_path.name))
-                    self.update_status(f"Moved {file_path.name} to {folder_name} folder")
-                except Exception as e:
-                    self.update_status(f"Error moving {file_path.name}: {str(e)}")
+        self.status_log.append(message)
+        self.status_view.refresh()
     
     def organize_files(self):
         folder_path = self.folder_path.get()
         if not folder_path:
             self.update_status("Please select a folder first!")
             return
+        if self.worker is not None and self.worker.is_alive():
+            return
         
-        self.status_text.delete(1.0, tk.END)
+        self.status_log.clear()
         self.update_status(f"Starting organization of {folder_path}")
         
+        if not os.path.isdir(folder_path):
+            self.update_status(f"An error occurred: Not a folder: {folder_path}")
+            return
+        # The asyncio pipeline runs on its own thread and loop; poll_worker
+        # drains its progress, so the Tk main loop never waits on disk I/O.
+        # asyncio is slow to import, so it loads on the first run, not at start
+        from organizer_async import AsyncWorker
+
+        journal_path = default_journal_path()
         try:
-            if self.org_method.get() == "extension":
-                self.organize_by_extension(folder_path)
-            else:
-                self.organize_by_date(folder_path)
-            self.update_status("Organization complete!")
-        except Exception as e:
-            self.update_status(f"An error occurred: {str(e)}")
+            os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+            self.journal = MoveJournal(journal_path, append=False)
+        except OSError as e:
+            # Organizing still works; only this run cannot be undone
+            self.update_status(f"Cannot record moves for undo: {str(e)}")
+            self.journal = None
+        self.worker = AsyncWorker(self.engine, folder_path, self.org_method.get(),
+                                  journal=self.journal,
+                                  collision_policy=self.collision_policy.get(),
+                                  movers=MOVE_WORKERS)
+        self.worker.start()
+        self.set_running(True)
+        self.root.after(STATUS_POLL_MS, self.poll_worker)
+    
+    def poll_worker(self):
+        """Drain queued worker progress in one batch, then reschedule"""
+        lines = []
+        done = None
+        while len(lines) < STATUS_BATCH_LIMIT:
+            try:
+                kind, payload = self.worker.progress.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "done":
+                done = payload
+                break
+            lines.append(payload)
+        if lines:
+            self.status_log.extend(lines)
+            self.status_view.refresh()
+        
+        if done is None:
+            self.root.after(STATUS_POLL_MS, self.poll_worker)
+            return
+        moved, failed, cancelled = done
+        if self.undoing is not None:
+            prune_folders(self.undoing)
+            self.undoing = None
+            if not failed and not cancelled:
+                try:
+                    os.remove(default_journal_path())
+                except OSError:
+                    pass
+            self.update_status(f"Undo finished. {moved} restored, {failed} failed")
+        elif cancelled:
+            self.update_status(f"Organization cancelled. {moved} moved, {failed} failed")
+        else:
+            self.update_status(f"Organization complete! {moved} moved, {failed} failed")
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        self.set_running(False)
+    
+    def undo_last_run(self):
+        """Move back every file recorded in the last run's journal"""
+        if self.worker is not None and self.worker.is_alive():
+            return
+        journal_path = default_journal_path()
+        if not os.path.exists(journal_path):
+            self.update_status("Nothing to undo")
+            return
+        
+        self.undoing = undo_moves(journal_path)
+        self.update_status(f"Undoing {len(self.undoing)} moves")
+        # Like the CLI's undo, a file whose old place is taken stays where it is
+        self.worker = OrganizeWorker(self.undoing, workers=MOVE_WORKERS,
+                                     mover=self.engine.mover,
+                                     collision_policy=RESTORE_POLICY)
+        self.worker.start()
+        self.set_running(True)
+        self.root.after(STATUS_POLL_MS, self.poll_worker)
+    
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        if self.worker.paused:
+            self.worker.resume()
+            self.pause_btn.configure(text="Pause")
+            self.update_status("Resumed")
+        else:
+            self.worker.pause()
+            self.pause_btn.configure(text="Resume")
+            self.update_status("Paused")
+    
+    def cancel_organize(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.update_status("Cancelling...")
+    
+    def set_running(self, running):
+        self.organize_btn.configure(state="disabled" if running else "normal")
+        self.pause_btn.configure(state="normal" if running else "disabled", text="Pause")
+        self.cancel_btn.configure(state="normal" if running else "disabled")
+        self.undo_btn.configure(state="disabled" if running else "normal")
 
 def main():
     root = tk.Tk()
     app = FileOrganizerApp(root)
     root.mainloop()
+    app.config_store.flush()
+    app.status_log.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,281 @@
+import os
+import time
+from collections import Counter, deque
+
+from organizer_dedup import DUPLICATES_GROUP
+from organizer_dirs import DestinationCache
+from organizer_move import COPY_BUFFER_SIZE
+from organizer_scan import FileRecord
+
+# What to do with archives: move them to the group of their dominant
+# content, or also unpack their files into the group folders
+ARCHIVE_ACTIONS = ("classify", "extract")
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Members per extraction task for zip files, which allow random access
+ZIP_CHUNK = 64
+
+
+def archive_kind(name):
+    """"zip", "tar" or "gz" for archives the standard library can read, else None"""
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        return "zip"
+    if lower.endswith(TAR_SUFFIXES):
+        return "tar"
+    if lower.endswith(".gz"):
+        return "gz"
+    return None
+
+
+def members(path):
+    """Yield a FileRecord for every regular file in an archive, in archive order.
+
+    Zip listings come from the central directory alone and tar archives are
+    read as a stream, so nothing is extracted or held in memory. A plain .gz
+    file has one member named after it, of unknown size (0). Record paths
+    point inside the archive, so rules that read file headers never match.
+    """
+    import tarfile
+    import zipfile
+
+    kind = archive_kind(path)
+    if kind == "zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield _record(path, info.filename, info.file_size, _zip_mtime(info))
+    elif kind == "tar":
+        with tarfile.open(path, "r|*") as archive:
+            for info in archive:
+                if info.isfile():
+                    yield _record(path, info.name, info.size, info.mtime)
+    elif kind == "gz":
+        yield _record(path, os.path.basename(path)[:-3], 0, os.stat(path).st_mtime)
+
+
+def _record(path, name, size, mtime):
+    # Only the base name is kept, so no member can point outside its folder
+    return FileRecord(os.path.join(path, name), os.path.basename(name), size, mtime,
+                      None, None, 0)
+
+
+def _zip_mtime(info):
+    return time.mktime(info.date_time + (0, 0, -1))
+
+
+def dominant_group(engine, records):
+    """The group most of the records' bytes (or, if sizes are unknown, files) belong to"""
+    now = time.time()
+    sizes = Counter()
+    counts = Counter()
+    for record in records:
+        if record.name:
+            group = engine.get_group(record, now)
+            sizes[group] += record.size or 0
+            counts[group] += 1
+    if not counts:
+        return None
+    return max(counts, key=lambda group: (sizes[group], counts[group]))
+
+
+def regroup(move, group):
+    """The move of an archive, sent to group instead of its own extension's group"""
+    # The group is the last part of the planned folder (it may sit in Year/Month)
+    folder = os.path.dirname(os.path.dirname(move.destination))
+    return move._replace(
+        destination=os.path.join(folder, group, os.path.basename(move.source)),
+        group=os.path.join(os.path.dirname(move.group), group))
+
+
+def archive_stage(moves, engine, folder_path, method="extension", action="classify",
+                  workers=4, dry_run=False, folders=None, on_failure=None):
+    """Pipeline stage between plan and execute that looks inside archives.
+
+    Other files and quarantined duplicates pass through untouched. With
+    "classify" an archive goes to the group of its dominant content instead
+    of the group of its own extension; the date method has no group
+    folders, so there it stays as planned. With "extract" the archive's
+    files are also unpacked straight into the folders they would be
+    organized into, by a pool of ``workers``: zip members are split across
+    workers, each with its own handle, and tar and gz archives are streamed
+    by one worker each. Every member is copied in blocks to a hidden
+    temporary name and renamed into place, so nothing is unpacked to a
+    scratch folder first.
+
+    Member names are claimed in ``folders`` (pass the DestinationCache the
+    executor uses) on the thread consuming the plan, so extracted files and
+    moved files never overwrite each other; a taken name is always renamed.
+    An archive's own move is passed on once its extraction has finished.
+    An archive that cannot be read or extracted is reported and left where
+    it is, whatever went wrong (a damaged stream, encryption, an unsupported
+    compression method), and the rest of the plan carries on; its move is
+    passed to ``on_failure``. Members already extracted from an archive
+    that fails are deleted again, so a later run does not unpack them twice.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if action not in ARCHIVE_ACTIONS:
+        raise ValueError(f"Unknown archive action: {action}")
+    folder_path = os.path.abspath(folder_path)
+    if folders is None:
+        folders = DestinationCache(engine.metrics)
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        extracting = deque()
+        for move in moves:
+            # Quarantined duplicates stay in the quarantine
+            if archive_kind(move.source) is None or move.group == DUPLICATES_GROUP:
+                yield move
+                continue
+            name = os.path.basename(move.source)
+            try:
+                records = list(members(move.source))
+            except Exception as e:
+                _failed(engine, "read", move, e, on_failure)
+                continue
+            if method != "date":
+                group = dominant_group(engine, records)
+                if group is not None:
+                    move = regroup(move, group)
+            if move.destination == move.source:
+                # Already where it belongs, and so, presumably, are its files
+                continue
+            if action == "classify":
+                yield move
+                continue
+            if dry_run:
+                engine.report(f"Would extract {len(records)} files from {name}")
+                yield move
+                continue
+            try:
+                destinations = _claim(engine, folder_path, method, records, folders)
+            except OSError as e:
+                _failed(engine, "extract", move, e, on_failure)
+                continue
+            extracting.append((move, destinations,
+                               _submit(pool, move.source, destinations, engine)))
+            while len(extracting) > workers:
+                move = _finish(engine, *extracting.popleft(), on_failure)
+                if move is not None:
+                    yield move
+        while extracting:
+            move = _finish(engine, *extracting.popleft(), on_failure)
+            if move is not None:
+                yield move
+
+
+def _claim(engine, folder_path, method, records, folders):
+    """Destination of each member (None for ones not to extract), names claimed"""
+    named = [record for record in records if record.name]
+    # A path inside an archive is never in its target folder, so every
+    # record gets a planned move, in the same order
+    planned = iter(engine.plan_records(folder_path, named, method))
+    destinations = []
+    for record in records:
+        if not record.name:
+            destinations.append(None)
+            continue
+        move = next(planned)
+        folders.ensure(os.path.dirname(move.destination))
+        destination, _ = folders.resolve(move.source, move.destination)
+        destinations.append(destination)
+    return destinations
+
+
+def _submit(pool, path, destinations, engine):
+    """Start extracting path; returns futures of extracted file counts"""
+    if archive_kind(path) != "zip":
+        return [pool.submit(_extract_stream, path, destinations, engine.metrics)]
+    return [pool.submit(_extract_zip, path, start, destinations[start:start + ZIP_CHUNK],
+                        engine.metrics)
+            for start in range(0, len(destinations), ZIP_CHUNK)]
+
+
+def _extract_zip(path, start, destinations, metrics):
+    import zipfile
+
+    extracted = 0
+    with zipfile.ZipFile(path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+        for info, destination in zip(infos[start:], destinations):
+            if destination is not None:
+                with archive.open(info) as source:
+                    _write(source, destination, _zip_mtime(info), metrics)
+                extracted += 1
+    return extracted
+
+
+def _extract_stream(path, destinations, metrics):
+    import gzip
+    import tarfile
+
+    if archive_kind(path) == "gz":
+        with gzip.open(path, 'rb') as source:
+            _write(source, destinations[0], os.stat(path).st_mtime, metrics)
+        return 1
+    extracted = 0
+    with tarfile.open(path, "r|*") as archive:
+        regular = (info for info in archive if info.isfile())
+        for info, destination in zip(regular, destinations):
+            if destination is not None:
+                _write(archive.extractfile(info), destination, info.mtime, metrics)
+                extracted += 1
+    return extracted
+
+
+def _write(source, destination, mtime, metrics):
+    import shutil
+
+    folder, name = os.path.split(destination)
+    partial = os.path.join(folder, f".{name}.part")
+    try:
+        with metrics.timer("extract"), open(partial, 'wb') as target:
+            shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+            size = target.tell()
+        os.utime(partial, (mtime, mtime))
+        os.replace(partial, destination)
+    except BaseException:
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+        raise
+    metrics.count("files_extracted")
+    metrics.count("bytes_extracted", size)
+
+
+def _finish(engine, move, destinations, futures, on_failure=None):
+    """Wait for an archive's extraction; returns its move, or None if it failed.
+
+    Every task is waited for before a failed archive's members are removed,
+    so none is still writing.
+    """
+    name = os.path.basename(move.source)
+    extracted = 0
+    error = None
+    for future in futures:
+        try:
+            extracted += future.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        # Claimed names were free, so whatever is there now came from this archive
+        for destination in destinations:
+            if destination is not None:
+                try:
+                    os.unlink(destination)
+                except OSError:
+                    pass
+        _failed(engine, "extract", move, error, on_failure)
+        return None
+    engine.report(f"Extracted {extracted} files from {name}")
+    return move
+
+
+def _failed(engine, phase, move, error, on_failure):
+    name = os.path.basename(move.source)
+    if on_failure is not None:
+        on_failure(move)
+    engine.metrics.error(phase, error)
+    verb = "reading" if phase == "read" else "extracting"
+    engine.report(f"Error {verb} {name}: {str(error)}; left where it is")
@@ -0,0 +1,304 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from organizer_dirs import DestinationCache
+from organizer_engine import OrganizerEngine, count_outcome, outcome_message, prepare_move
+from organizer_scan import scan
+
+MOVERS = 8
+QUEUE_SIZE = 64
+BATCH_SIZE = 256
+
+
+class AsyncPipeline:
+    """Organizes a folder as asyncio stages joined by bounded queues.
+
+    scan -> classify -> plan -> move (``movers`` tasks) -> journal
+
+    Every blocking call (listing, stat, header reads, mkdir, rename or copy,
+    journal writes) runs in a thread pool, so the event loop stays free and
+    on slow network filesystems many moves are in flight at once. Records
+    and plans travel in batches of ``batch_size``; each queue holds at most
+    ``queue_size`` items, so a stage that falls behind makes the earlier
+    ones wait and memory stays constant however large the folder is.
+
+    ``pause``, ``resume`` and ``cancel`` may be called from any thread. A
+    cancelled run stops scanning and finishes the moves already started.
+    """
+
+    def __init__(self, engine, folder_path, method="extension", journal=None,
+                 collision_policy=None, report=None, movers=MOVERS, queue_size=QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, executor=None, **scan_options):
+        if not os.path.isdir(folder_path):
+            raise NotADirectoryError(f"Not a folder: {folder_path}")
+        self.engine = engine
+        self.folder_path = os.path.abspath(folder_path)
+        self.method = method
+        self.journal = journal
+        self.collision_policy = collision_policy or engine.collision_policy
+        self.report = report or engine.report
+        self.movers = max(1, movers)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.executor = executor
+        needs_stat, _ = engine.classifier(method)
+        scan_options.setdefault("stat", needs_stat)
+        self.scan_options = scan_options
+        self.moved = self.failed = 0
+        self.paused = False
+        self.cancelled = False
+        self._loop = None
+        self._resumed = None
+
+    def pause(self):
+        self.paused = True
+        self._notify()
+
+    def resume(self):
+        self.paused = False
+        self._notify()
+
+    def cancel(self):
+        self.cancelled = True
+        # A paused run has to wake up to notice the cancel
+        self.paused = False
+        self._notify()
+
+    def _notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._update)
+
+    def _update(self):
+        if self.paused:
+            self._resumed.clear()
+        else:
+            self._resumed.set()
+
+    async def run(self):
+        """Organize the folder; returns (moved, failed)"""
+        self._resumed = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._update()
+        executor = self.executor or ThreadPoolExecutor(max_workers=self.movers + 2)
+        records = asyncio.Queue(self.queue_size)
+        planned = asyncio.Queue(self.queue_size)
+        moves = asyncio.Queue(self.queue_size)
+        done = asyncio.Queue(self.queue_size)
+        movers = [self._move(executor, moves, done) for _ in range(self.movers)]
+        tasks = [asyncio.ensure_future(stage) for stage in (
+            self._scan(executor, records),
+            self._classify(executor, records, planned),
+            self._plan(executor, planned, moves),
+            self._finish_moves(movers, done),
+            self._record(executor, done),
+        )]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.executor is None:
+                executor.shutdown(wait=False)
+        return self.moved, self.failed
+
+    async def _scan(self, executor, records):
+        loop = asyncio.get_running_loop()
+        found = scan(self.folder_path, **self.scan_options)
+        found = self.engine.metrics.timed(found, "scan")
+        while not self.cancelled:
+            batch = await loop.run_in_executor(executor, _take, found, self.batch_size)
+            if not batch:
+                break
+            await records.put(batch)
+        await records.put(None)
+
+    async def _classify(self, executor, records, planned):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await records.get()
+            if batch is None:
+                break
+            if self.cancelled:
+                # Keep draining so the scan stage is never left blocked
+                continue
+            # Rules may read file headers, so classifying is blocking too
+            batch = await loop.run_in_executor(executor, self._plan_batch, batch)
+            if batch:
+                await planned.put(batch)
+        await planned.put(None)
+
+    def _plan_batch(self, records):
+        return list(self.engine.plan_records(self.folder_path, records, self.method))
+
+    async def _plan(self, executor, planned, moves):
+        loop = asyncio.get_running_loop()
+        # Folders and names are settled by this one stage, so movers never
+        # race for the same destination
+        folders = DestinationCache(self.engine.metrics)
+        while True:
+            batch = await planned.get()
+            if batch is None:
+                break
+            if self.cancelled:
+                continue
+            prepared = await loop.run_in_executor(executor, self._prepare_batch,
+                                                  batch, folders)
+            for move, action, error in prepared:
+                if error is not None:
+                    self._failed(move, error)
+                elif action == "skip":
+                    count_outcome(self.engine.metrics, move, action)
+                    self.report(outcome_message(move, action))
+                else:
+                    await moves.put((move, action))
+        for _ in range(self.movers):
+            await moves.put(None)
+
+    def _prepare_batch(self, batch, folders):
+        prepared = []
+        for move in batch:
+            try:
+                move, action = prepare_move(move, folders, self.collision_policy)
+                prepared.append((move, action, None))
+            except OSError as e:
+                prepared.append((move, None, e))
+        return prepared
+
+    async def _move(self, executor, moves, done):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await moves.get()
+            if item is None:
+                return
+            await self._resumed.wait()
+            move, action = item
+            if self.cancelled:
+                continue
+            try:
+                if action == "duplicate":
+                    await loop.run_in_executor(executor, os.remove, move.source)
+                else:
+                    await loop.run_in_executor(executor, self.engine.mover.move,
+                                               move.source, move.destination)
+                await done.put((move, action, None))
+            except Exception as e:
+                await done.put((move, action, e))
+
+    async def _finish_moves(self, movers, done):
+        await asyncio.gather(*movers)
+        await done.put(None)
+
+    async def _record(self, executor, done):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await done.get()
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size or done.empty():
+                    break
+                item = done.get_nowait()
+            if batch:
+                completed = [move for move, action, error in batch
+                             if error is None and action != "duplicate"]
+                if self.journal is not None and completed:
+                    await loop.run_in_executor(executor, self._journal_batch, completed)
+                for move, action, error in batch:
+                    if error is None:
+                        self.moved += 1
+                        count_outcome(self.engine.metrics, move, action)
+                        self.report(outcome_message(move, action))
+                    else:
+                        self._failed(move, error)
+            if item is None:
+                return
+
+    def _journal_batch(self, moves):
+        with self.engine.metrics.timer("journal"):
+            for move in moves:
+                self.journal.record(move)
+
+    def _failed(self, move, error):
+        self.failed += 1
+        self.engine.metrics.count("files_failed")
+        self.engine.metrics.error("move", error)
+        self.report(f"Error moving {os.path.basename(move.source)}: {str(error)}")
+
+
+def _take(iterator, count):
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= count:
+            break
+    return batch
+
+
+async def organize(root, config=None, method="extension", *, report=None, journal=None,
+                   collision_policy="rename", movers=MOVERS, queue_size=QUEUE_SIZE,
+                   **scan_options):
+    """Organize root from within a running event loop; returns (moved, failed).
+
+    ``config`` is a config dict as in organizer_config.json (its "groups",
+    "rules" and "dates"); scan_options are passed to organizer_scan.scan.
+    Raises ValueError for an invalid config and NotADirectoryError if root
+    is not a folder.
+    """
+    engine = OrganizerEngine(config, report=report, collision_policy=collision_policy)
+    pipeline = AsyncPipeline(engine, root, method, journal=journal, movers=movers,
+                             queue_size=queue_size, **scan_options)
+    return await pipeline.run()
+
+
+class AsyncWorker:
+    """Runs an AsyncPipeline on its own thread and event loop.
+
+    Same interface and progress protocol as organizer_worker.OrganizeWorker
+    (``("status", message)`` per file, then ``("done", (moved, failed,
+    cancelled))``), so a GUI main loop can drive it by polling
+    ``self.progress`` without ever blocking.
+    """
+
+    def __init__(self, engine, folder_path, method="extension", journal=None,
+                 collision_policy=None, movers=MOVERS, **scan_options):
+        self.progress = queue.Queue()
+        self.pipeline = AsyncPipeline(
+            engine, folder_path, method, journal=journal, collision_policy=collision_policy,
+            report=lambda message: self.progress.put(("status", message)),
+            movers=movers, **scan_options)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            asyncio.run(self.pipeline.run())
+        except Exception as e:
+            self.progress.put(("status", f"An error occurred: {str(e)}"))
+        self.progress.put(("done", (self.pipeline.moved, self.pipeline.failed,
+                                    self.pipeline.cancelled)))
+
+    def pause(self):
+        self.pipeline.pause()
+
+    def resume(self):
+        self.pipeline.resume()
+
+    def cancel(self):
+        self.pipeline.cancel()
+
+    @property
+    def paused(self):
+        return self.pipeline.paused
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,382 @@
+import argparse
+import builtins
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+
+from organizer_dirs import COLLISION_POLICIES, DestinationCache
+from organizer_engine import DEFAULT_GROUPS, METHODS, OrganizerEngine
+
+# Relative weights of the extensions in a generated tree
+DEFAULT_MIX = {"txt": 4, "pdf": 2, "docx": 1, "jpg": 4, "png": 2, "mp3": 1,
+               "mp4": 1, "zip": 1, "py": 2, "dat": 1}
+DEFAULT_FILES = 10000
+FILE_SIZE = 4096
+FANOUT = 4
+YEAR = 365 * 86400
+
+# Start-up time, in ms, the console entry point may add to a bare interpreter
+STARTUP_BUDGET_MS = 40
+STARTUP_RUNS = 20
+# What each start-up case runs in a fresh interpreter (with -c or -m)
+STARTUP_CASES = {
+    "python": ["-c", "pass"],
+    "import": ["-c", "import organizer_cli"],
+    "help": ["-m", "organizer_cli", "--help"],
+}
+# Modules the console entry point must not load just to start; features
+# that need them import them when used
+HEAVY_MODULES = ("tkinter", "asyncio", "concurrent.futures", "multiprocessing", "zipfile",
+                 "tarfile", "gzip", "sqlite3", "ctypes", "hashlib", "tempfile", "cProfile")
+
+# os functions counted as syscalls; os.path helpers go through os.stat.
+# DirEntry.stat() is implemented in C and cannot be counted this way.
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir", "mkdir", "replace", "rename",
+                 "remove", "unlink", "link", "open", "close", "fsync", "sendfile",
+                 "copy_file_range", "utime", "chmod")
+
+
+class SyscallCounter:
+    """Counts calls to the os functions in COUNTED_CALLS while installed.
+
+    The modules look these functions up on ``os`` at call time, so swapping
+    the module attributes catches every call without tracing the process.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self._saved = {}
+
+    def install(self):
+        for name in COUNTED_CALLS:
+            function = getattr(os, name, None)
+            if function is not None:
+                self._saved[name] = function
+                setattr(os, name, self._wrap(name, function))
+        self._saved["builtins.open"] = builtins.open
+        builtins.open = self._wrap("open", builtins.open)
+
+    def uninstall(self):
+        builtins.open = self._saved.pop("builtins.open")
+        for name, function in self._saved.items():
+            setattr(os, name, function)
+        self._saved = {}
+
+    def _wrap(self, name, function):
+        counts = self.counts
+
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return counted
+
+
+def parse_mix(value):
+    """{"txt": 4, ...} from "txt=4,jpg=2" """
+    mix = {}
+    for part in value.split(","):
+        extension, _, weight = part.partition("=")
+        try:
+            mix[extension.strip().lstrip('.')] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad extension weight: {part!r}")
+    return mix
+
+
+def generate_tree(root, files=DEFAULT_FILES, mix=None, collisions=0.0, depth=0,
+                  fanout=FANOUT, size=FILE_SIZE, cross_device=None, group_for=None,
+                  seed=0):
+    """Fill root with a reproducible synthetic tree to organize.
+
+    Files are spread over ``fanout`` subfolders per level down to ``depth``,
+    with extensions drawn from ``mix`` and mtimes over the past three years.
+    ``collisions`` is the fraction of files whose name already exists in
+    their destination group folder, which needs ``group_for(name)``. With
+    ``cross_device`` the group folders are symlinks to folders created
+    there, so every move has to copy across devices.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    extensions, weights = list(mix), list(mix.values())
+    folders = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(parent, f"dir{i}") for parent in level for i in range(fanout)]
+        folders += level
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+
+    linked = set()
+    data = bytes(rng.getrandbits(8) for _ in range(size))
+    now = time.time()
+    for i in range(files):
+        name = f"file{i:07d}.{rng.choices(extensions, weights)[0]}"
+        path = os.path.join(rng.choice(folders), name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        mtime = now - rng.random() * 3 * YEAR
+        os.utime(path, (mtime, mtime))
+        if group_for is None:
+            continue
+        group = group_for(name)
+        if cross_device and group not in linked:
+            target = os.path.join(cross_device, group)
+            os.makedirs(target, exist_ok=True)
+            os.symlink(target, os.path.join(root, group))
+            linked.add(group)
+        if rng.random() < collisions:
+            group_folder = os.path.join(root, group)
+            os.makedirs(group_folder, exist_ok=True)
+            with open(os.path.join(group_folder, name), 'wb') as f:
+                f.write(data[:1])
+    return folders
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def run_case(case):
+    """Generate one tree, organize it and measure; returns the result dict.
+
+    Meant to run in its own process so peak RSS belongs to this case alone.
+    """
+    engine = OrganizerEngine({"groups": DEFAULT_GROUPS},
+                             collision_policy=case["on_conflict"])
+    with ExitStack() as stack:
+        root = stack.enter_context(tempfile.TemporaryDirectory(dir=case.get("tmp")))
+        other = None
+        if case.get("cross_device"):
+            other = stack.enter_context(
+                tempfile.TemporaryDirectory(dir=case["cross_device"]))
+        generate_tree(root, case["files"], case["mix"], case["collisions"], case["depth"],
+                      size=case["size"], cross_device=other,
+                      group_for=engine.get_group_for_name, seed=case["seed"])
+        counter = SyscallCounter()
+        latencies = []
+        moved = failed = 0
+        folders = DestinationCache()
+        counter.install()
+        try:
+            start = time.perf_counter()
+            for move in engine.plan(root, case["method"], recursive=case["depth"] > 0):
+                began = time.perf_counter()
+                action = engine.move_file(move, folders=folders)
+                latencies.append(time.perf_counter() - began)
+                if action is None:
+                    failed += 1
+                else:
+                    moved += 1
+            elapsed = time.perf_counter() - start
+        finally:
+            counter.uninstall()
+
+    latencies.sort()
+    handled = max(1, moved + failed)
+    return {
+        "name": case["name"],
+        "params": {key: case[key] for key in ("method", "files", "depth", "collisions",
+                                              "size", "on_conflict", "mix")},
+        "cross_device": bool(case.get("cross_device")),
+        "moved": moved,
+        "failed": failed,
+        "seconds": round(elapsed, 4),
+        "files_per_sec": round(handled / elapsed, 1) if elapsed else None,
+        "syscalls_per_file": round(sum(counter.counts.values()) / handled, 2),
+        "syscalls": dict(counter.counts.most_common()),
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                        // (1024 if sys.platform == "darwin" else 1),
+        "latency_ms": {"p50": round(percentile(latencies, 50) * 1000, 4),
+                       "p99": round(percentile(latencies, 99) * 1000, 4),
+                       "max": round(latencies[-1] * 1000, 4) if latencies else 0.0},
+    }
+
+
+def startup(runs=STARTUP_RUNS):
+    """Measure how fast the console entry point starts; returns the result dict.
+
+    Every case in STARTUP_CASES runs ``runs`` times in a fresh interpreter,
+    interleaved so drift in the machine's load affects them alike, and the
+    median wall time is kept. "overhead_ms" is what importing the CLI adds
+    to a bare interpreter; it is compared with STARTUP_BUDGET_MS.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = {name: [] for name in STARTUP_CASES}
+    for _ in range(runs):
+        for name, command in STARTUP_CASES.items():
+            began = time.perf_counter()
+            subprocess.run([sys.executable] + command, cwd=here, check=True,
+                           stdout=subprocess.DEVNULL)
+            times[name].append(time.perf_counter() - began)
+    median = {name: round(statistics.median(values) * 1000, 2)
+              for name, values in times.items()}
+
+    probe = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import sys, organizer_cli; print(' '.join(sys.modules))"],
+        cwd=here, check=True, capture_output=True, text=True)
+    loaded = set(probe.stdout.split())
+    # "import time: self [us] | cumulative | name" for every module imported
+    imports = []
+    for line in probe.stderr.splitlines():
+        fields = line.partition(":")[2].split("|")
+        if len(fields) == 3 and fields[0].strip().isdigit():
+            imports.append((int(fields[0]), fields[2].strip()))
+    imports.sort(reverse=True)
+    return {
+        "ms": median,
+        "overhead_ms": round(median["import"] - median["python"], 2),
+        "budget_ms": STARTUP_BUDGET_MS,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in loaded],
+        "slowest_imports": {name: round(us / 1000, 2) for us, name in imports[:8]},
+    }
+
+
+def suite_cases(args):
+    base = dict(files=args.files, mix=args.mix, depth=0, collisions=0.0,
+                method="extension", size=args.size, on_conflict="rename",
+                seed=args.seed, tmp=args.tmp)
+    cases = [
+        dict(base, name="flat-extension"),
+        dict(base, name="flat-date", method="date"),
+        dict(base, name="nested-extension", depth=3),
+        dict(base, name="collisions-extension", collisions=0.25),
+    ]
+    if args.cross_device:
+        cases.append(dict(base, name="cross-device-extension",
+                          cross_device=args.cross_device))
+    return cases
+
+
+def single_case(args):
+    name = f"{args.method}-{args.files}f-d{args.depth}-c{args.collisions:g}"
+    if args.cross_device:
+        name += "-xdev"
+    return dict(name=name, files=args.files, mix=args.mix, depth=args.depth,
+                collisions=args.collisions, method=args.method, size=args.size,
+                on_conflict=args.on_conflict, seed=args.seed, tmp=args.tmp,
+                cross_device=args.cross_device)
+
+
+def compare(results, baseline):
+    """Print the change from a baseline result file, case by case"""
+    if "startup" in results and "startup" in baseline:
+        change = results["startup"]["overhead_ms"] - baseline["startup"]["overhead_ms"]
+        print(f"startup: {change:+.2f} ms import overhead")
+    before = {case["name"]: case for case in baseline["cases"]}
+    for case in results["cases"]:
+        old = before.get(case["name"])
+        if old is None:
+            continue
+        # files_per_sec is None for a run too fast to time
+        if case["files_per_sec"] and old["files_per_sec"]:
+            speed = f"{case['files_per_sec'] / old['files_per_sec'] - 1:+.1%}"
+        else:
+            speed = "n/a"
+        p99 = case["latency_ms"]["p99"] - old["latency_ms"]["p99"]
+        print(f"{case['name']}: {speed} files/sec, "
+              f"{p99:+.4f} ms p99, "
+              f"{case['syscalls_per_file'] - old['syscalls_per_file']:+.2f} syscalls/file")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="organizer_bench",
+        description="Benchmark organizing synthetic folder trees and save the results "
+                    "as JSON for comparison between versions.")
+    parser.add_argument("--suite", action="store_true",
+                        help="run the standard set of cases instead of a single one")
+    parser.add_argument("--startup", action="store_true",
+                        help="measure the start-up time of the console entry point "
+                             "instead; exits 1 if it is over budget or loads heavy "
+                             "modules")
+    parser.add_argument("-m", "--method", choices=METHODS, default="extension")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES,
+                        help="files per generated tree")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="extension weights, e.g. txt=4,jpg=2,pdf=1")
+    parser.add_argument("--depth", type=int, default=0,
+                        help="subfolder levels, with %d subfolders each" % FANOUT)
+    parser.add_argument("--collisions", type=float, default=0.0,
+                        help="fraction of files whose name is already taken in "
+                             "the destination folder")
+    parser.add_argument("--on-conflict", choices=COLLISION_POLICIES, default="rename",
+                        help="collision policy used while organizing")
+    parser.add_argument("--size", type=int, default=FILE_SIZE,
+                        help="bytes per generated file")
+    parser.add_argument("--cross-device", metavar="DIR",
+                        help="put the group folders under DIR (on another device) "
+                             "so moves copy across devices")
+    parser.add_argument("--tmp", metavar="DIR",
+                        help="where to generate trees (defaults to the system temp dir)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="run every case this many times")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="write the results as JSON to FILE")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="print the change from an earlier results FILE")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cases = suite_cases(args) if args.suite else [single_case(args)]
+    results = {"created": datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "cases": []}
+    status = 0
+    if args.startup:
+        cases = []
+        result = results["startup"] = startup(STARTUP_RUNS * args.repeat)
+        print(f"startup: {result['ms']['import']} ms to import the CLI, "
+              f"{result['ms']['help']} ms for --help, "
+              f"{result['ms']['python']} ms for a bare interpreter")
+        print(f"import overhead {result['overhead_ms']} ms "
+              f"(budget {result['budget_ms']} ms)")
+        if result["overhead_ms"] > result["budget_ms"]:
+            print("Over budget; slowest imports (ms): " + ", ".join(
+                f"{name} {ms}" for name, ms in result["slowest_imports"].items()))
+            status = 1
+        if result["heavy_modules"]:
+            print(f"Loaded at start-up: {', '.join(result['heavy_modules'])}")
+            status = 1
+    for case in cases:
+        for _ in range(args.repeat):
+            # A fresh process per run keeps peak RSS and caches separate
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_case, case).result()
+            results["cases"].append(result)
+            print(f"{result['name']}: {result['files_per_sec']} files/sec, "
+                  f"{result['syscalls_per_file']} syscalls/file, "
+                  f"p99 {result['latency_ms']['p99']} ms, "
+                  f"peak RSS {result['peak_rss_kib']} KiB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+import argparse
+import os
+import signal
+import sys
+from contextlib import ExitStack
+
+from organizer_archive import ARCHIVE_ACTIONS, archive_stage
+from organizer_config import CONFIG_FILE, read_config
+from organizer_dates import DATE_SOURCES, GRANULARITIES
+from organizer_dedup import DUPLICATE_ACTIONS, DUPLICATES_GROUP, dedupe
+from organizer_dirs import COLLISION_POLICIES, DestinationCache
+from organizer_engine import METHODS, OrganizerEngine
+from organizer_move import COPY_WORKERS, Mover
+from organizer_multi import DEVICE_LIMITS, MultiRootJob
+from organizer_index import ScanIndex
+from organizer_metrics import Metrics, profiled
+from organizer_journal import MoveJournal, plan_path, resume, undo
+from organizer_plan import describe, read_plan, write_plan
+from organizer_watch import DEBOUNCE_SECONDS, POLL_INTERVAL, FolderWatch
+from organizer_worker import EXECUTORS, OrganizeWorker
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="file-organizer",
+        description="Sort the files of a folder into groups by type or date.")
+    parser.add_argument("folder", nargs="*",
+                        help="folders to organize (defaults to last_path from the config); "
+                             "several folders are organized in parallel, per device")
+    parser.add_argument("-m", "--method", choices=METHODS,
+                        default="extension", help="organization method")
+    parser.add_argument("-c", "--config", default=CONFIG_FILE,
+                        help="path to organizer_config.json")
+    parser.add_argument("--granularity", choices=GRANULARITIES,
+                        help="size of the date folders for the date methods "
+                             "(default: the config's, else month)")
+    parser.add_argument("--timezone", metavar="ZONE",
+                        help="time zone for date folders, e.g. UTC or Europe/Berlin "
+                             "(default: local time)")
+    parser.add_argument("--date-source", action="append", choices=DATE_SOURCES,
+                        help="where a file's date comes from, tried in the order given "
+                             "(repeatable; mtime is the last resort)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="also organize files in subfolders")
+    parser.add_argument("--max-depth", type=int,
+                        help="how many subfolder levels to descend (implies --recursive)")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="only organize file names matching GLOB (repeatable)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="skip files and folders matching GLOB (repeatable)")
+    parser.add_argument("--hidden", action="store_true",
+                        help="also organize hidden files and folders (names starting "
+                             "with a dot, like .DS_Store)")
+    parser.add_argument("--index", metavar="FILE",
+                        help="SQLite index of earlier runs; only new or changed files "
+                             "are organized and unchanged folders are not rescanned")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="show what would be moved without moving anything")
+    parser.add_argument("--plan-out", metavar="FILE",
+                        help="write the move plan as JSON Lines to FILE ('-' for stdout) "
+                             "instead of moving")
+    parser.add_argument("--apply-plan", metavar="FILE",
+                        help="apply a plan previously written with --plan-out")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="record every completed move in FILE so the run can be "
+                             "resumed or undone")
+    parser.add_argument("--resume", metavar="FILE",
+                        help="finish an interrupted run recorded with --journal FILE")
+    parser.add_argument("--undo", metavar="FILE",
+                        help="move back every file recorded in journal FILE")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of parallel movers (1 moves serially)")
+    parser.add_argument("--executor", choices=sorted(EXECUTORS), default="thread",
+                        help="pool type used when --workers is above 1")
+    parser.add_argument("--on-conflict", choices=COLLISION_POLICIES, default="rename",
+                        help="what to do when the destination already has a file "
+                             "with the same name")
+    parser.add_argument("--duplicates", choices=DUPLICATE_ACTIONS,
+                        help="find identical files first and skip, hard-link or "
+                             "quarantine all but one copy")
+    parser.add_argument("--archives", choices=ARCHIVE_ACTIONS,
+                        help="look inside zip and tar archives: file each one with the "
+                             "group of most of its content, or also extract its files "
+                             "into their group folders")
+    parser.add_argument("--quarantine-dir", metavar="DIR",
+                        help="where --duplicates quarantine puts copies "
+                             "(defaults to FOLDER/Duplicates)")
+    parser.add_argument("--copy-workers", type=int, default=COPY_WORKERS,
+                        help="most cross-device copies to run at once")
+    parser.add_argument("--verify", action="store_true",
+                        help="checksum cross-device copies before deleting the source "
+                             "(not with --executor process)")
+    parser.add_argument("--device-limit", action="append", metavar="KIND=N",
+                        type=device_limit, default=[],
+                        help="concurrent moves per device of KIND (ssd, hdd, network, "
+                             "unknown) when organizing several folders (repeatable)")
+    parser.add_argument("-w", "--watch", action="store_true",
+                        help="keep running and organize new files as they arrive")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS,
+                        help="seconds a new file must stay quiet before it is moved")
+    parser.add_argument("--poll", action="store_true",
+                        help="watch by polling instead of inotify")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="seconds between polls with --poll")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write counters and per-phase timings to FILE when the run "
+                             "ends (Prometheus text for a .prom FILE, else JSON)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile the run with cProfile and save the stats to FILE")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only print the final summary")
+    return parser
+
+
+def device_limit(value):
+    kind, _, count = value.partition("=")
+    if kind not in DEVICE_LIMITS or not count.isdigit() or int(count) < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected KIND=N with KIND one of {', '.join(DEVICE_LIMITS)}: {value!r}")
+    return kind, int(count)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        config = read_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Invalid configuration: {str(e)}", file=sys.stderr)
+        return 2
+    dates = dict(config.get("dates") or {})
+    for key, value in (("granularity", args.granularity), ("timezone", args.timezone),
+                       ("sources", args.date_source)):
+        if value:
+            dates[key] = value
+    config["dates"] = dates
+    metrics = Metrics() if args.metrics else None
+    mover = Mover(copy_workers=args.copy_workers, verify=args.verify, metrics=metrics)
+    try:
+        engine = OrganizerEngine(config, report=None if args.quiet else print, mover=mover,
+                                 collision_policy=args.on_conflict, metrics=metrics)
+    except ValueError as e:
+        print(f"Invalid configuration: {str(e)}", file=sys.stderr)
+        return 2
+    try:
+        if args.undo:
+            restored, failed = undo(args.undo, engine.report)
+            print(f"Undo complete! {restored} restored, {failed} failed")
+            return 1 if failed else 0
+
+        with ExitStack() as stack:
+            if metrics is not None:
+                stack.callback(metrics.write, args.metrics)
+            if args.profile:
+                stack.enter_context(profiled(args.profile))
+            if args.archives and args.watch:
+                parser.error("--archives does not work with --watch")
+            if args.archives == "extract" and (args.resume or args.apply_plan
+                                               or args.journal):
+                # Extracted files are new, so there is no move to journal or undo
+                parser.error("--archives extract does not work with a journal or plan")
+            if args.resume:
+                fp = stack.enter_context(open(plan_path(args.resume), 'r'))
+                journal = stack.enter_context(MoveJournal(args.resume))
+                return run(engine, resume(read_plan(fp), journal), args, journal)
+
+            if len(args.folder) > 1:
+                for option in ("apply_plan", "plan_out", "index", "duplicates",
+                               "archives", "watch"):
+                    if getattr(args, option):
+                        parser.error(f"--{option.replace('_', '-')} takes a single folder")
+                return run_roots(engine, args.folder, args, stack)
+
+            index = None
+            # Archives that could not be read while the plan was written
+            unreadable = []
+            if args.apply_plan:
+                source_plan = args.apply_plan
+            else:
+                folder = args.folder[0] if args.folder else config.get("last_path", "")
+                if not folder:
+                    parser.error("no folder given and no last_path in the config")
+                if not os.path.isdir(folder):
+                    raise NotADirectoryError(f"Not a folder: {folder}")
+                if args.watch:
+                    return watch(engine, folder, args, stack)
+                if args.duplicates == "quarantine" and not args.quarantine_dir:
+                    args.quarantine_dir = os.path.join(os.path.abspath(folder),
+                                                       DUPLICATES_GROUP)
+                if args.index:
+                    index = stack.enter_context(ScanIndex(args.index))
+                moves = engine.plan(folder, args.method, index=index,
+                                    recursive=args.recursive,
+                                    max_depth=args.max_depth, include=args.include,
+                                    exclude=args.exclude, hidden=args.hidden,
+                                    stat=bool(args.plan_out or args.journal
+                                              or args.duplicates))
+                if args.plan_out:
+                    moves = duplicate_stage(engine, moves, args, dry_run=True)
+                    return export_plan(archives(engine, moves, folder, args, dry_run=True),
+                                       args.plan_out)
+                if not args.journal or args.dry_run:
+                    status = run(engine, moves, args, folder=folder, index=index)
+                    if index is not None and not args.dry_run:
+                        index.commit()
+                    return status
+                # A journaled run works from a plan on disk so it can resume
+                with open(plan_path(args.journal), 'w') as out:
+                    write_plan(archives(engine, moves, folder, args, dry_run=True,
+                                        on_failure=failure_hook(index, unreadable)), out)
+                source_plan = plan_path(args.journal)
+
+            journal = None
+            if args.journal and not args.dry_run:
+                if source_plan != plan_path(args.journal):
+                    import shutil
+
+                    shutil.copyfile(source_plan, plan_path(args.journal))
+                journal = stack.enter_context(MoveJournal(args.journal, append=False))
+            fp = stack.enter_context(open(source_plan, 'r'))
+            status = run(engine, read_plan(fp), args, journal, index=index,
+                         failed=len(unreadable))
+            if index is not None:
+                # Committed once the moves are done, so failed ones are retried
+                index.commit()
+            return status
+    except (OSError, ValueError) as e:
+        print(f"An error occurred: {str(e)}", file=sys.stderr)
+        return 2
+
+
+def watch(engine, folder, args, stack):
+    """Organize folder, then keep organizing arrivals until interrupted"""
+    journal = None
+    if args.journal:
+        journal = stack.enter_context(MoveJournal(args.journal))
+    watcher = FolderWatch(engine, folder, args.method, debounce=args.debounce,
+                          poll=args.poll, poll_interval=args.poll_interval,
+                          include=args.include, exclude=args.exclude, journal=journal,
+                          hidden=args.hidden)
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    print("Stopped watching")
+    return 0
+
+
+def export_plan(moves, path):
+    if path == "-":
+        write_plan(moves, sys.stdout)
+        return 0
+    with open(path, 'w') as fp:
+        count = write_plan(moves, fp)
+    print(f"Wrote {count} planned moves to {path}")
+    return 0
+
+
+def duplicate_stage(engine, moves, args, dry_run=False):
+    if not args.duplicates:
+        return moves
+    return dedupe(moves, args.duplicates, quarantine=args.quarantine_dir,
+                  workers=max(args.workers, 4), report=engine.report, dry_run=dry_run)
+
+
+def archives(engine, moves, folder, args, dry_run=False, folders=None, on_failure=None):
+    if not args.archives:
+        return moves
+    return archive_stage(moves, engine, folder, args.method, args.archives,
+                         workers=max(args.workers, 4), dry_run=dry_run, folders=folders,
+                         on_failure=on_failure)
+
+
+def failure_hook(index, failures):
+    """on_failure for a stage before execute: adds the move to failures and
+    leaves its file out of the ScanIndex"""
+    def on_failure(move):
+        failures.append(move)
+        if index is not None:
+            index.forget(move.source)
+    return on_failure
+
+
+def run(engine, moves, args, journal=None, folder=None, index=None, failed=0):
+    """Apply moves; files whose move fails are left out of the ScanIndex.
+
+    ``failed`` counts failures from before the plan was applied (archives
+    that could not be read while it was written); they count in the summary
+    and exit status like failed moves.
+    """
+    on_failure = None
+    if index is not None:
+        on_failure = lambda move: index.forget(move.source)
+    moves = duplicate_stage(engine, moves, args, dry_run=args.dry_run)
+    # Shared with the archive stage, which claims names for extracted files
+    folders = DestinationCache(engine.metrics)
+    unextracted = []
+    if folder is not None:
+        moves = archives(engine, moves, folder, args, dry_run=args.dry_run, folders=folders,
+                         on_failure=failure_hook(index, unextracted))
+    if args.dry_run:
+        count = 0
+        for move in moves:
+            engine.report(describe(move))
+            count += 1
+        print(f"Dry run: {count} files would be moved")
+        return 0
+
+    if args.workers > 1:
+        moved, move_failed, cancelled = run_worker(engine, moves, args, journal, folders,
+                                                   on_failure)
+    else:
+        moved, move_failed = engine.execute(moves, journal, folders, on_failure)
+        cancelled = False
+    failed += move_failed + len(unextracted)
+    if cancelled:
+        print(f"Organization cancelled. {moved} moved, {failed} failed")
+        return 130
+    print(f"Organization complete! {moved} moved, {failed} failed")
+    return 1 if failed else 0
+
+
+def run_roots(engine, folders, args, stack):
+    """Organize several folders at once, each device at its own pace"""
+    scan_options = dict(recursive=args.recursive, max_depth=args.max_depth,
+                        include=args.include, exclude=args.exclude, hidden=args.hidden)
+    if args.dry_run:
+        count = 0
+        for folder in folders:
+            for move in engine.plan(folder, args.method, stat=False, **scan_options):
+                engine.report(describe(move))
+                count += 1
+        print(f"Dry run: {count} files would be moved")
+        return 0
+
+    journal = plan = None
+    if args.journal:
+        # Like a single-folder journaled run, work from a plan on disk so it can resume
+        plan = plan_path(args.journal)
+        with open(plan, 'w') as out:
+            write_plan((move for folder in folders
+                        for move in engine.plan(folder, args.method, stat=True,
+                                                **scan_options)), out)
+        journal = stack.enter_context(MoveJournal(args.journal, append=False))
+    job = MultiRootJob(engine, folders, args.method, limits=dict(args.device_limit),
+                       journal=journal, plan=plan, **scan_options)
+    try:
+        moved, failed = job.run()
+    except KeyboardInterrupt:
+        print("Organization cancelled")
+        return 130
+    for root, (root_moved, root_failed, skipped, _) in job.snapshot().items():
+        print(f"{root}: {root_moved} moved, {root_failed} failed, {skipped} skipped")
+    print(f"Organization complete! {moved} moved, {failed} failed")
+    return 1 if failed else 0
+
+
+def run_worker(engine, moves, args, journal=None, folders=None, on_failure=None):
+    """Run the parallel worker in the foreground; Ctrl-C cancels it"""
+    worker = OrganizeWorker(moves, workers=args.workers, executor=args.executor,
+                            journal=journal, mover=engine.mover,
+                            collision_policy=engine.collision_policy,
+                            metrics=engine.metrics, folders=folders,
+                            on_failure=on_failure)
+    worker.start()
+    while True:
+        try:
+            kind, payload = worker.progress.get()
+        except KeyboardInterrupt:
+            worker.cancel()
+            continue
+        if kind == "done":
+            return payload
+        engine.report(payload)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
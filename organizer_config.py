@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+
+from organizer_rules import RuleSet
+
+CONFIG_FILE = "organizer_config.json"
+SAVE_DELAY = 0.5
+# Expected type of each known top-level key; unknown keys are kept as they are
+CONFIG_TYPES = {"groups": dict, "last_path": str, "rules": list, "dates": dict}
+TYPE_NAMES = {dict: "an object", str: "a string", list: "a list"}
+# Rule and "dates" keys by the kind of value they take
+RULE_PATTERN_KEYS = ("extensions", "name", "regex", "magic")
+RULE_SIZE_KEYS = ("min_size", "max_size")
+RULE_AGE_KEYS = ("older_than_days", "newer_than_days")
+DATE_STRING_KEYS = ("granularity", "timezone")
+RULES_CACHE_SIZE = 8
+
+_rules_cache = {}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def default_config():
+    return {"groups": {}, "last_path": ""}
+
+
+def validate_config(config):
+    """Check the shape of a config dict; raises ConfigError listing every problem.
+
+    The type of every value is checked here, rules and date settings
+    included, so later steps only ever see well-formed values. Whether they
+    make sense (patterns that compile, known granularities and time zones)
+    is checked when the engine compiles them (see compile_rules and
+    organizer_dates.bucketer_from_config), which raise ValueError too.
+    """
+    if not isinstance(config, dict):
+        raise ConfigError("The config must be a JSON object")
+    problems = []
+    for key, expected in CONFIG_TYPES.items():
+        if key in config and not isinstance(config[key], expected):
+            problems.append(f'"{key}" must be {TYPE_NAMES[expected]}')
+    groups = config.get("groups")
+    if isinstance(groups, dict):
+        for group, extensions in groups.items():
+            if (not isinstance(extensions, list)
+                    or not all(isinstance(e, str) for e in extensions)):
+                problems.append(f'group "{group}" must be a list of extensions')
+    rules = config.get("rules")
+    if isinstance(rules, list):
+        for position, rule in enumerate(rules, 1):
+            problems += _rule_problems(position, rule)
+    dates = config.get("dates")
+    if isinstance(dates, dict):
+        for key in DATE_STRING_KEYS:
+            if dates.get(key) is not None and not isinstance(dates[key], str):
+                problems.append(f'"dates" "{key}" must be a string')
+        if "sources" in dates and not _strings(dates["sources"]):
+            problems.append('"dates" "sources" must be a string or a list of strings')
+    if problems:
+        raise ConfigError("; ".join(problems))
+    return config
+
+
+def _rule_problems(position, rule):
+    if not isinstance(rule, dict):
+        return [f"rule {position} must be an object"]
+    problems = []
+    if not isinstance(rule.get("group"), str) or not rule["group"]:
+        problems.append(f'rule {position} "group" must be a folder name')
+    for key in RULE_PATTERN_KEYS:
+        if key in rule and not _strings(rule[key]):
+            problems.append(f'rule {position} "{key}" must be a string or a list '
+                            'of strings')
+    for key in RULE_SIZE_KEYS + RULE_AGE_KEYS:
+        if key in rule and not _number(rule[key], allow_text=key in RULE_SIZE_KEYS):
+            kind = "a size" if key in RULE_SIZE_KEYS else "a number"
+            problems.append(f'rule {position} "{key}" must be {kind}')
+    return problems
+
+
+def _strings(value):
+    """True for a string or a list of strings"""
+    return isinstance(value, str) or (isinstance(value, list)
+                                      and all(isinstance(v, str) for v in value))
+
+
+def _number(value, allow_text=False):
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, (int, float)) or (allow_text and isinstance(value, str))
+
+
+def read_config(config_file=CONFIG_FILE):
+    """Load and validate a config; a missing file gives the default config.
+
+    Raises ConfigError for a file that is not valid JSON or has the wrong
+    shape, and OSError if it cannot be read.
+    """
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return default_config()
+    except ValueError as e:
+        raise ConfigError(f"{config_file} is not valid JSON: {e}")
+    validate_config(config)
+    for key, value in default_config().items():
+        config.setdefault(key, value)
+    return config
+
+
+def load_config(config_file=CONFIG_FILE):
+    """Like read_config, but falls back to the default config on any problem"""
+    try:
+        return read_config(config_file)
+    except (OSError, ValueError):
+        return default_config()
+
+
+def save_config(config, config_file=CONFIG_FILE):
+    """Write the config atomically: a crash leaves the old file or the new one"""
+    write_atomic(config_file, json.dumps(config, indent=4))
+
+
+def write_atomic(path, text):
+    import tempfile
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, partial = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.",
+                                   suffix=".tmp")
+    try:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        # mkstemp makes the file private; keep the permissions the file had
+        os.chmod(partial, mode)
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+    except BaseException:
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+        raise
+
+
+def compile_rules(rules):
+    """A RuleSet for rules, reused while the rules stay the same.
+
+    Group edits and folder picks rebuild the engine's lookups but leave the
+    rules alone, so their regexes are compiled again only when they change.
+    """
+    key = json.dumps(rules, sort_keys=True)
+    compiled = _rules_cache.get(key)
+    if compiled is None:
+        compiled = RuleSet(rules)
+        if len(_rules_cache) >= RULES_CACHE_SIZE:
+            _rules_cache.pop(next(iter(_rules_cache)))
+        _rules_cache[key] = compiled
+    return compiled
+
+
+class ConfigStore:
+    """The config file with debounced background saves and hot reload.
+
+    ``data`` is the live config dict (the engine and app share it). ``save``
+    snapshots it and writes it atomically on a timer thread after
+    ``save_delay`` seconds, so a burst of edits costs one write and the
+    caller never waits on the disk. ``reload_if_changed`` re-reads the file
+    when something else changed it; our own writes are recognised by their
+    stat signature and ignored. Errors from background saves are kept in
+    ``save_error`` for the caller to report.
+
+    While the file on disk is invalid (``load_error``) it is not overwritten:
+    ``save`` raises ConfigError until the file is fixed and reloaded, or the
+    caller confirms with ``save(force=True)``.
+    """
+
+    def __init__(self, path=CONFIG_FILE, save_delay=SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.save_error = None
+        self._signature = None
+        self._timer = None
+        self._pending = None
+        self._writing = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.data = default_config()
+        self.load_error = None
+        try:
+            self.data = read_config(path)
+        except (OSError, ValueError) as e:
+            self.load_error = e
+        self._signature = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def save(self, force=False):
+        """Schedule a write of the current data"""
+        if self.load_error is not None and not force:
+            raise ConfigError(f"{self.path} could not be loaded ({self.load_error}); "
+                              "not overwriting it")
+        self.load_error = None
+        text = json.dumps(self.data, indent=4)
+        with self._lock:
+            self._pending = text
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write any scheduled save now"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                text, self._pending = self._pending, None
+                if text is None:
+                    return
+                self._writing = True
+            # Outside the lock, so save() never waits for the disk
+            try:
+                write_atomic(self.path, text)
+                self._signature = self._stat()
+                self.save_error = None
+            except OSError as e:
+                self.save_error = e
+            finally:
+                self._writing = False
+
+    @property
+    def saving(self):
+        return self._pending is not None or self._writing
+
+    def reload_if_changed(self):
+        """Re-read the file if it changed on disk; returns True if data changed.
+
+        The live dict is updated in place so everything sharing it sees the
+        new values. Raises ConfigError (data unchanged) if the new file is
+        invalid, and keeps the file from being saved over until it is fixed;
+        a pending save of our own wins over an outside edit.
+        """
+        signature = self._stat()
+        if signature == self._signature or signature is None or self.saving:
+            return False
+        self._signature = signature
+        try:
+            config = read_config(self.path)
+        except (OSError, ValueError) as e:
+            self.load_error = e
+            raise
+        self.load_error = None
+        self.data.clear()
+        self.data.update(config)
+        return True
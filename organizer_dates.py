@@ -0,0 +1,286 @@
+import os
+import re
+import struct
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+DATE_SOURCES = ("mtime", "ctime", "exif", "filename")
+# EXIF dates are normally within the first few KB of the file
+EXIF_READ_SIZE = 16 * 1024
+EXIF_EXTENSIONS = {"jpg", "jpeg", "jpe", "tif", "tiff", "dng", "nef", "cr2", "arw",
+                   "orf", "rw2", "pef"}
+
+# 2024-05-17, 2024_05_17, 20240517 ... not inside a longer run of digits
+FILENAME_DATE = re.compile(
+    r"(?<!\d)((?:19|20)\d\d)[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])(?!\d)")
+
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+
+# Bucket start timestamps with their names for years first..last; ``end``
+# is where the last bucket stops
+BucketTable = namedtuple("BucketTable", "starts flat nested end first_year last_year")
+
+
+def parse_timezone(name):
+    """A tzinfo for an IANA name or "UTC"; None means the local time zone"""
+    if not name or name == "local":
+        return None
+    if name.upper() == "UTC":
+        return timezone.utc
+    try:
+        from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    except ImportError:
+        raise ValueError(f"Time zones other than UTC need Python 3.9+: {name}")
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+class DateBucketer:
+    """Maps timestamps to date folder names through a table of bucket starts.
+
+    Instead of building a datetime and formatting a string per file, the
+    start timestamps of every bucket (day, ISO week, month, quarter or year)
+    in the years seen so far are computed once, with their folder names. A
+    timestamp is then found with one bisect, and files from the bucket last
+    hit, by far the common case, with two comparisons. The table grows by
+    whole years when a timestamp falls outside it. Boundaries are wall-clock
+    midnights in ``tz`` (local time when None), so DST shifts are honored.
+
+    Each bucket has a flat name ("2024-05") for the date method and a
+    nested one ("2024/05") for date-group.
+
+    One bucketer may serve several planning threads: the table and the
+    last-hit bucket are replaced as whole immutable tuples, never updated
+    in place, so a lookup always reads one consistent table.
+    """
+
+    def __init__(self, granularity="month", tz=None, sources=("mtime",)):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown date granularity: {granularity}")
+        unknown = [source for source in sources if source not in DATE_SOURCES]
+        if unknown or not sources:
+            raise ValueError(f"Unknown date sources: {', '.join(unknown) or '(none)'}")
+        self.granularity = granularity
+        self.tz = tz
+        self.sources = tuple(sources)
+        self.table = None
+        # (start, end, position, table) of the bucket hit last
+        self._last = (0.0, -1.0, 0, None)
+        self._lock = threading.Lock()
+
+    def lookup(self, timestamp):
+        """(table, position) of the bucket holding timestamp"""
+        start, end, position, table = self._last
+        if start <= timestamp < end:
+            return table, position
+        table = self.table
+        if table is None or not table.starts[0] <= timestamp < table.end:
+            with self._lock:
+                table = self.table
+                if table is None or not table.starts[0] <= timestamp < table.end:
+                    table = self.table = self._cover(table, timestamp)
+        position = bisect_right(table.starts, timestamp) - 1
+        end = table.starts[position + 1] if position + 1 < len(table.starts) else table.end
+        self._last = (table.starts[position], end, position, table)
+        return table, position
+
+    def label(self, timestamp):
+        table, position = self.lookup(timestamp)
+        return table.flat[position]
+
+    def folder(self, timestamp):
+        table, position = self.lookup(timestamp)
+        return table.nested[position]
+
+    def timestamp_for(self, record):
+        """Timestamp of a FileRecord from the first source that has one"""
+        for source in self.sources:
+            if source == "mtime":
+                if record.mtime is not None:
+                    return record.mtime
+                value = _stat_time(record.path, "st_mtime")
+            elif source == "ctime":
+                # Creation time where the platform records it, else inode change
+                value = _stat_time(record.path, "st_birthtime")
+                if value is None:
+                    value = _stat_time(record.path, "st_ctime")
+            elif source == "exif":
+                value = self._wall_clock(exif_datetime(record.path))
+            else:
+                value = self._wall_clock(filename_date(record.name))
+            if value is not None:
+                return value
+        # Every file has an mtime to fall back on
+        return record.mtime
+
+    def _wall_clock(self, moment):
+        if moment is None:
+            return None
+        if self.tz is not None:
+            moment = moment.replace(tzinfo=self.tz)
+        try:
+            return moment.timestamp()
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    def _cover(self, table, timestamp):
+        """A new table covering the years of table and of timestamp"""
+        year = datetime.fromtimestamp(timestamp, self.tz).year
+        first = year if table is None else min(year, table.first_year)
+        last = year if table is None else max(year, table.last_year)
+        starts, flat, nested = [], [], []
+        for day, parts in self._buckets(first, last):
+            starts.append(self._midnight(day))
+            flat.append('-'.join(parts))
+            nested.append(os.path.join(*parts))
+        return BucketTable(tuple(starts), tuple(flat), tuple(nested),
+                           self._midnight(self._next(day)), first, last)
+
+    def _midnight(self, day):
+        return datetime(day.year, day.month, day.day, tzinfo=self.tz).timestamp()
+
+    def _buckets(self, first, last):
+        """(first day, name parts) of every bucket touching years first..last"""
+        day = date(first, 1, 1)
+        if self.granularity == "week":
+            day -= timedelta(days=day.weekday())
+        end = date(last + 1, 1, 1)
+        while day < end:
+            yield day, self._parts(day)
+            day = self._next(day)
+
+    def _parts(self, day):
+        if self.granularity == "day":
+            return (f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+        if self.granularity == "week":
+            year, week, _ = day.isocalendar()
+            return (f"{year:04d}", f"W{week:02d}")
+        if self.granularity == "month":
+            return (f"{day.year:04d}", f"{day.month:02d}")
+        if self.granularity == "quarter":
+            return (f"{day.year:04d}", f"Q{(day.month - 1) // 3 + 1}")
+        return (f"{day.year:04d}",)
+
+    def _next(self, day):
+        """First day of the bucket after the one starting at day"""
+        if self.granularity == "day":
+            return day + timedelta(days=1)
+        if self.granularity == "week":
+            return day + timedelta(days=7)
+        if self.granularity == "year":
+            return date(day.year + 1, 1, 1)
+        months = 3 if self.granularity == "quarter" else 1
+        month = day.month - 1 + months
+        return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def bucketer_from_config(settings):
+    """DateBucketer from the config's "dates" section; raises ValueError"""
+    settings = settings or {}
+    sources = settings.get("sources", ["mtime"])
+    if isinstance(sources, str):
+        sources = [sources]
+    return DateBucketer(settings.get("granularity", "month"),
+                        parse_timezone(settings.get("timezone")), sources)
+
+
+def _stat_time(path, field):
+    try:
+        return getattr(os.stat(path), field, None)
+    except OSError:
+        return None
+
+
+def filename_date(name):
+    """The first valid date written in a file name, as a datetime, or None"""
+    for found in FILENAME_DATE.finditer(name):
+        try:
+            return datetime(*(int(part) for part in found.groups()))
+        except ValueError:
+            continue
+    return None
+
+
+def exif_datetime(path):
+    """DateTimeOriginal (else DateTime) from a JPEG or TIFF-based file.
+
+    Only the first EXIF_READ_SIZE bytes are read; files of other types are
+    not opened at all.
+    """
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in os.path.basename(path) else ''
+    if extension not in EXIF_EXTENSIONS:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(EXIF_READ_SIZE)
+    except OSError:
+        return None
+    if header[:2] == b'\xff\xd8':
+        header = _jpeg_exif(header)
+        if header is None:
+            return None
+    try:
+        return _tiff_datetime(header)
+    except (struct.error, ValueError, IndexError):
+        return None
+
+
+def _jpeg_exif(data):
+    """The TIFF block of a JPEG's EXIF APP1 segment, or None"""
+    offset = 2
+    while offset + 4 <= len(data) and data[offset] == 0xFF:
+        marker = data[offset + 1]
+        length = struct.unpack_from(">H", data, offset + 2)[0]
+        if marker == 0xE1 and data[offset + 4:offset + 10] == b'Exif\0\0':
+            return data[offset + 10:offset + 2 + length]
+        if marker == 0xDA:
+            # Image data starts; metadata segments come before it
+            return None
+        offset += 2 + length
+    return None
+
+
+def _tiff_datetime(data):
+    if data[:4] == b'II*\0':
+        order = "<"
+    elif data[:4] == b'MM\0*':
+        order = ">"
+    else:
+        return None
+    ifd0 = struct.unpack_from(order + "I", data, 4)[0]
+    tags = _ifd_tags(data, ifd0, order)
+    value = None
+    if TAG_EXIF_IFD in tags:
+        exif_tags = _ifd_tags(data, tags[TAG_EXIF_IFD][1], order)
+        value = _ascii(data, exif_tags.get(TAG_DATETIME_ORIGINAL), order)
+    if value is None:
+        value = _ascii(data, tags.get(TAG_DATETIME), order)
+    if value is None:
+        return None
+    return datetime.strptime(value[:19], "%Y:%m:%d %H:%M:%S")
+
+
+def _ifd_tags(data, offset, order):
+    """{tag: (count, value or offset)} of one IFD"""
+    count = struct.unpack_from(order + "H", data, offset)[0]
+    tags = {}
+    for entry in range(count):
+        tag, _, items, value = struct.unpack_from(order + "HHII", data, offset + 2 + entry * 12)
+        tags[tag] = (items, value)
+    return tags
+
+
+def _ascii(data, entry, order):
+    if entry is None:
+        return None
+    items, offset = entry
+    if items < 19 or offset + items > len(data):
+        return None
+    return data[offset:offset + items].rstrip(b'\0 ').decode('ascii', 'replace')
@@ -0,0 +1,147 @@
+import os
+from collections import defaultdict
+
+# How duplicates are handled: left where they are, hard-linked to the first
+# copy, or moved to a quarantine folder
+DUPLICATE_ACTIONS = ("skip", "link", "quarantine")
+DUPLICATES_GROUP = "Duplicates"
+EDGE_BLOCK_SIZE = 64 * 1024
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def edge_digest(path, size):
+    """Hash only the first and last block of a file"""
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(EDGE_BLOCK_SIZE))
+        if size > EDGE_BLOCK_SIZE:
+            f.seek(max(EDGE_BLOCK_SIZE, size - EDGE_BLOCK_SIZE))
+            digest.update(f.read(EDGE_BLOCK_SIZE))
+    return digest.digest()
+
+
+def full_digest(path, size):
+    import hashlib
+
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def find_duplicates(entries, workers=4):
+    """Group identical files; entries is a list of (path, size).
+
+    Files are bucketed by size first, then by a hash of their first and last
+    blocks, and only files that still collide are hashed in full. Hashing
+    runs in a thread pool. Returns lists of indices into entries, each list
+    in input order, for every set of two or more identical files. Empty
+    files are never reported.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    by_size = defaultdict(list)
+    for index, (path, size) in enumerate(entries):
+        if size:
+            by_size[size].append(index)
+    candidates = [group for group in by_size.values() if len(group) > 1]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        candidates = _split(candidates, entries, edge_digest, pool)
+        # When the edge blocks cover the whole file there is nothing left to read
+        small = [g for g in candidates if entries[g[0]][1] <= 2 * EDGE_BLOCK_SIZE]
+        large = [g for g in candidates if entries[g[0]][1] > 2 * EDGE_BLOCK_SIZE]
+        return small + _split(large, entries, full_digest, pool)
+
+
+def _split(groups, entries, digest, pool):
+    indices = [index for group in groups for index in group]
+    digests = pool.map(lambda index: _safe_digest(digest, *entries[index]), indices)
+    by_key = defaultdict(list)
+    for index, value in zip(indices, digests):
+        if value is not None:
+            by_key[(entries[index][1], value)].append(index)
+    return [sorted(group) for group in by_key.values() if len(group) > 1]
+
+
+def _safe_digest(digest, path, size):
+    try:
+        return digest(path, size)
+    except OSError:
+        return None
+
+
+def dedupe(moves, action="skip", quarantine=None, workers=4, report=None,
+           dry_run=False):
+    """Pipeline stage between plan and execute that handles duplicate files.
+
+    The first file of each identical set is passed through unchanged. The
+    others are dropped from the plan ("skip"), replaced on disk by a hard
+    link to the first copy before moving so they share its storage
+    ("link"), or sent to the ``quarantine`` folder instead of their group.
+    Sizes come from the plan when it has them. Unlike the rest of the
+    pipeline this stage has to see the whole plan before yielding.
+    """
+    if action not in DUPLICATE_ACTIONS:
+        raise ValueError(f"Unknown duplicate action: {action}")
+    if action == "quarantine" and not quarantine:
+        raise ValueError("A quarantine folder is needed to quarantine duplicates")
+    report = report or (lambda message: None)
+
+    moves = list(moves)
+    entries = [(move.source, move.size if move.size is not None else _size(move.source))
+               for move in moves]
+    keeper_of = {}
+    for group in find_duplicates(entries, workers):
+        for index in group[1:]:
+            keeper_of[index] = group[0]
+
+    # Link everything before the first move so no first copy has moved yet
+    unlinked = {}
+    if action == "link" and not dry_run:
+        for index, keeper in keeper_of.items():
+            try:
+                link_over(moves[keeper].source, moves[index].source)
+            except OSError as e:
+                unlinked[index] = e
+
+    for index, move in enumerate(moves):
+        keeper = keeper_of.get(index)
+        if keeper is None:
+            yield move
+            continue
+        name = os.path.basename(move.source)
+        original = os.path.basename(moves[keeper].source)
+        if action == "skip":
+            report(f"Skipped {name}: duplicate of {original}")
+        elif action == "quarantine":
+            yield move._replace(destination=os.path.join(quarantine, name),
+                                group=DUPLICATES_GROUP)
+        else:
+            if index in unlinked:
+                report(f"Error linking {name}: {str(unlinked[index])}")
+            else:
+                report(f"Linked {name} to its duplicate {original}")
+            yield move
+
+
+def link_over(target, path):
+    """Atomically replace path with a hard link to target"""
+    folder, name = os.path.split(path)
+    temporary = os.path.join(folder, f".{name}.link")
+    os.link(target, temporary)
+    try:
+        os.replace(temporary, path)
+    except OSError:
+        os.unlink(temporary)
+        raise
+
+
+def _size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
@@ -0,0 +1,131 @@
+import os
+import threading
+
+from organizer_metrics import NULL_METRICS
+
+# What to do when a file with the same name is already in the destination
+COLLISION_POLICIES = ("rename", "skip", "overwrite-newer", "dedupe")
+# Internal policy for undo: a file goes back exactly where it came from or not at all
+RESTORE_POLICY = "refuse"
+
+
+class DestinationCache:
+    """Per-run cache of destination folders.
+
+    ``ensure`` creates a folder (and any missing parents, so nested layouts
+    like ``2024/05/Images`` work) the first time it is seen and is free
+    afterwards, so mkdir calls scale with the number of folders rather than
+    the number of files. ``names`` lists a folder once with ``os.scandir``
+    so collision checks are set lookups instead of one ``exists()`` per file.
+    Folder creation is timed as the "mkdir" phase of the optional ``metrics``.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self._ready = set()
+        self._names = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def ensure(self, folder):
+        if folder in self._ready:
+            return
+        with self._lock:
+            if folder in self._ready:
+                return
+            with self.metrics.timer("mkdir"):
+                os.makedirs(folder, exist_ok=True)
+            self.metrics.count("folders_ensured")
+            # Every ancestor exists now too; remember them for sibling layouts
+            path = folder
+            while path and path not in self._ready:
+                self._ready.add(path)
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+    def names(self, folder):
+        """The set of entry names in folder, loaded on first use and kept current"""
+        names = self._names.get(folder)
+        if names is None:
+            with self._lock:
+                names = self._names.get(folder)
+                if names is None:
+                    try:
+                        with os.scandir(folder) as entries:
+                            names = {entry.name for entry in entries}
+                    except FileNotFoundError:
+                        names = set()
+                    self._names[folder] = names
+        return names
+
+    def exists(self, path):
+        folder, name = os.path.split(path)
+        return name in self.names(folder)
+
+    def added(self, path):
+        """Note that a file now exists at path"""
+        folder, name = os.path.split(path)
+        names = self._names.get(folder)
+        if names is not None:
+            names.add(name)
+
+    def resolve(self, source, destination, policy="rename"):
+        """Decide how to move source to destination given what is already there.
+
+        Returns ``(destination, action)``; action is "move", "overwrite",
+        "skip" or "duplicate" (an identical file is already in place, so the
+        source can go). The chosen name is claimed at once, so later files of
+        the same run see it without touching the disk. With RESTORE_POLICY a
+        taken name raises FileExistsError. Call from one thread.
+        """
+        if policy not in COLLISION_POLICIES and policy != RESTORE_POLICY:
+            raise ValueError(f"Unknown collision policy: {policy}")
+        folder, name = os.path.split(destination)
+        names = self.names(folder)
+        if name not in names:
+            names.add(name)
+            return destination, "move"
+        if policy == RESTORE_POLICY:
+            raise FileExistsError(f"{destination} already exists")
+        if policy == "skip":
+            return destination, "skip"
+        if policy == "overwrite-newer":
+            try:
+                newer = os.stat(source).st_mtime > os.stat(destination).st_mtime
+            except OSError:
+                newer = False
+            return destination, "overwrite" if newer else "skip"
+        if policy == "dedupe" and _identical(source, destination):
+            return destination, "duplicate"
+        return self._rename(folder, name, names), "move"
+
+    def _rename(self, folder, name, names):
+        """Claim the first free "name (n).ext", resuming from the last n used"""
+        stem, extension = os.path.splitext(name)
+        key = (folder, stem, extension)
+        number = self._counters.get(key, 1)
+        candidate = f"{stem} ({number}){extension}"
+        while candidate in names:
+            number += 1
+            candidate = f"{stem} ({number}){extension}"
+        self._counters[key] = number + 1
+        names.add(candidate)
+        return os.path.join(folder, candidate)
+
+    def removed(self, path):
+        """Note that the file at path is gone"""
+        folder, name = os.path.split(path)
+        names = self._names.get(folder)
+        if names is not None:
+            names.discard(name)
+
+
+def _identical(first, second):
+    import filecmp
+
+    try:
+        return filecmp.cmp(first, second, shallow=False)
+    except OSError:
+        return False
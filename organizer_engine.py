@@ -0,0 +1,265 @@
+import os
+import time
+
+from organizer_config import compile_rules
+from organizer_dates import bucketer_from_config
+from organizer_dirs import DestinationCache
+from organizer_metrics import NULL_METRICS
+from organizer_move import Mover, default_mover
+from organizer_plan import PlannedMove
+from organizer_scan import scan
+
+DEFAULT_GROUPS = {
+    "Documents": ["pdf", "doc", "docx", "txt", "rtf", "odt"],
+    "Images": ["jpg", "jpeg", "png", "gif", "bmp", "tiff"],
+    "Videos": ["mp4", "avi", "mkv", "mov", "wmv"],
+    "Audio": ["mp3", "wav", "flac", "m4a", "aac"],
+    "Archives": ["zip", "rar", "7z", "tar", "gz"],
+    "Code": ["py", "java", "cpp", "html", "css", "js"]
+}
+
+# "date-group" nests type folders inside Year/Month folders
+METHODS = ("extension", "date", "date-group")
+
+# Folder for files whose name has no extension at all
+NO_EXTENSION_GROUP = "Other"
+
+
+def move_to(source, destination):
+    """Move source to destination; the destination folder must already exist.
+
+    Kept at module level so process pools can pickle it.
+    """
+    return default_mover.move(source, destination)
+
+
+def prepare_move(move, folders, policy="rename"):
+    """Create the destination folder and settle any name collision.
+
+    Returns the move with its final destination and the action to take
+    (see DestinationCache.resolve).
+    """
+    folders.ensure(os.path.dirname(move.destination))
+    destination, action = folders.resolve(move.source, move.destination, policy)
+    if action != "skip":
+        folders.removed(move.source)
+    return move._replace(destination=destination), action
+
+
+def outcome_message(move, action):
+    name = os.path.basename(move.source)
+    if action == "skip":
+        return f"Skipped {name}: {move.group} folder already has one"
+    if action == "duplicate":
+        return f"Removed {name}: an identical copy is already in {move.group} folder"
+    return f"Moved {name} to {move.group} folder"
+
+
+def count_outcome(metrics, move, action):
+    if action == "skip":
+        metrics.count("files_skipped")
+    elif action == "duplicate":
+        metrics.count("files_deduplicated")
+    else:
+        metrics.count("files_moved")
+        if move.size:
+            metrics.count("bytes_moved", move.size)
+
+
+class ExtensionIndex:
+    """Reverse index from extension to group, built once per groups change.
+
+    Extensions may have several parts (``tar.gz``); the longest listed suffix
+    of a file name wins. Keys are stored in lower and upper case so the
+    common spellings hit the dict directly and only mixed-case names pay
+    for a ``lower()``.
+    """
+
+    def __init__(self, groups):
+        self.lookup = {}
+        self.max_parts = 1
+        for group, extensions in groups.items():
+            for extension in extensions:
+                extension = extension.strip().lstrip('.').lower()
+                if not extension:
+                    continue
+                # The first group listing an extension wins, like the old linear scan
+                self.lookup.setdefault(extension, group)
+                self.lookup.setdefault(extension.upper(), group)
+                self.max_parts = max(self.max_parts, extension.count('.') + 1)
+
+    def group_for_extension(self, extension):
+        group = self.lookup.get(extension)
+        if group is None:
+            group = self.lookup.get(extension.lower())
+        return group
+
+    def match(self, name):
+        """Return (group, extension) for a file name; group is None if unlisted"""
+        # Leading dots mark hidden files, not extensions (like Path.suffix)
+        parts = name.lstrip('.').split('.')
+        for count in range(min(self.max_parts, len(parts) - 1), 0, -1):
+            extension = '.'.join(parts[-count:])
+            group = self.group_for_extension(extension)
+            if group is not None:
+                return group, extension
+        return None, parts[-1] if len(parts) > 1 else ''
+
+
+class OrganizerEngine:
+    """Sorts the files of a folder into group folders without any GUI.
+
+    Progress messages go to the optional ``report`` callable, one call per
+    file, so callers decide how (and how often) to display them. Scan,
+    classify and journal timings and per-file outcomes go to the optional
+    ``metrics`` (see organizer_metrics.Metrics).
+    """
+
+    def __init__(self, config=None, report=None, mover=None, collision_policy="rename",
+                 metrics=None):
+        self.config = config if config is not None else {"groups": {}, "last_path": ""}
+        self.report = report or (lambda message: None)
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.mover = mover or Mover(metrics=self.metrics)
+        self.collision_policy = collision_policy
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Recompile the rules, date buckets and extension lookup; call after
+        the config changes.
+
+        Raises ValueError if the config's "rules" or "dates" are invalid.
+        """
+        self.rules = compile_rules(self.config.get("rules", []))
+        self.dates = bucketer_from_config(self.config.get("dates"))
+        self.index = ExtensionIndex(self.config.get("groups", {}))
+
+    def get_group_for_extension(self, extension):
+        group = self.index.group_for_extension(extension)
+        return group if group is not None else extension.upper()
+
+    def get_group_for_name(self, name):
+        group, extension = self.index.match(name)
+        if group is not None:
+            return group
+        return extension.upper() if extension else NO_EXTENSION_GROUP
+
+    def get_group(self, record, now=None):
+        """Group for a FileRecord: the first matching rule, else its extension group"""
+        if self.rules:
+            group = self.rules.match(record.name, record.path, record.size,
+                                     record.mtime, now)
+            if group is not None:
+                return group
+        return self.get_group_for_name(record.name)
+
+    def plan(self, folder_path, method="extension", index=None, **scan_options):
+        """Yield a PlannedMove for every file to move, without touching the disk.
+
+        scan_options are passed to organizer_scan.scan (recursive, max_depth,
+        include, exclude, stat, hidden). Files already inside their target folder are
+        left alone so recursive runs do not shuffle organized files. The plan
+        is a generator, so memory stays bounded however many files there are.
+
+        With a ScanIndex only files that are new or changed since the last
+        committed run are planned, and unchanged directories are not listed.
+        Directory listings are only cached by scans with the default filters:
+        a folder listed with include or exclude patterns, or with hidden
+        files, may hold files another run would not have seen.
+        """
+        if not os.path.isdir(folder_path):
+            raise NotADirectoryError(f"Not a folder: {folder_path}")
+        # Absolute paths keep exported plans valid from any working directory
+        folder_path = os.path.abspath(folder_path)
+        # Classifying by name needs no stat call unless sizes are wanted
+        needs_stat, _ = self.classifier(method)
+        if needs_stat or index is not None:
+            scan_options["stat"] = True
+        scan_options.setdefault("stat", False)
+        if index is not None and not (scan_options.get("include")
+                                      or scan_options.get("exclude")
+                                      or scan_options.get("hidden")):
+            scan_options["dir_cache"] = index
+        records = self.metrics.timed(scan(folder_path, **scan_options), "scan")
+        if index is not None:
+            records = index.unseen(records)
+        return self.plan_records(folder_path, records, method)
+
+    def classifier(self, method):
+        """Return (needs_stat, folder_for) where folder_for(record) names the target"""
+        # Age rules are measured from one instant per plan
+        now = time.time()
+        if method == "extension":
+            return self.rules.needs_stat, lambda record: self.get_group(record, now)
+        dates = self.dates
+        if method == "date":
+            return True, lambda record: dates.label(dates.timestamp_for(record))
+        if method == "date-group":
+            return True, lambda record: os.path.join(
+                dates.folder(dates.timestamp_for(record)), self.get_group(record, now))
+        raise ValueError(f"Unknown organization method: {method}")
+
+    def plan_records(self, folder_path, records, method="extension"):
+        """Yield a PlannedMove for each FileRecord, organizing into folder_path"""
+        _, folder_for = self.classifier(method)
+        timer = self.metrics.timer
+        for record in records:
+            with timer("classify"):
+                folder_name = folder_for(record)
+            new_folder = os.path.join(folder_path, folder_name)
+            if os.path.dirname(record.path) != new_folder:
+                yield PlannedMove(record.path, os.path.join(new_folder, record.name),
+                                  folder_name, record.size, record.mtime)
+
+    def move_file(self, move, journal=None, folders=None):
+        """Apply one PlannedMove; returns the action taken, or None if it failed"""
+        name = os.path.basename(move.source)
+        if folders is None:
+            folders = DestinationCache(self.metrics)
+        try:
+            move, action = prepare_move(move, folders, self.collision_policy)
+            if action == "duplicate":
+                os.remove(move.source)
+            elif action != "skip":
+                self.mover.move(move.source, move.destination)
+                if journal is not None:
+                    with self.metrics.timer("journal"):
+                        journal.record(move)
+            count_outcome(self.metrics, move, action)
+            self.report(outcome_message(move, action))
+            return action
+        except Exception as e:
+            self.metrics.count("files_failed")
+            self.metrics.error("move", e)
+            self.report(f"Error moving {name}: {str(e)}")
+            return None
+
+    def execute(self, moves, journal=None, folders=None, on_failure=None):
+        """Apply a plan (any iterable of PlannedMove); returns (moved, failed).
+
+        Completed moves are recorded in the optional MoveJournal. Skipped
+        files count as neither. ``on_failure(move)`` is called for every move
+        that could not be applied.
+        """
+        moved = failed = 0
+        if folders is None:
+            folders = DestinationCache(self.metrics)
+        for move in moves:
+            action = self.move_file(move, journal, folders)
+            if action is None:
+                failed += 1
+                if on_failure is not None:
+                    on_failure(move)
+            elif action != "skip":
+                moved += 1
+        return moved, failed
+
+    def organize_by_extension(self, folder_path, **scan_options):
+        return self.execute(self.plan(folder_path, "extension", **scan_options))
+
+    def organize_by_date(self, folder_path, **scan_options):
+        return self.execute(self.plan(folder_path, "date", **scan_options))
+
+    def organize(self, folder_path, method="extension", **scan_options):
+        """Organize folder_path by "extension" or "date"; returns (moved, failed)"""
+        return self.execute(self.plan(folder_path, method, **scan_options))
@@ -0,0 +1,129 @@
+import json
+import os
+
+INDEX_FILE = "organizer_index.sqlite3"
+WRITE_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    inode INTEGER,
+    size INTEGER,
+    mtime REAL,
+    PRIMARY KEY (folder, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    subdirs TEXT
+) WITHOUT ROWID;
+"""
+
+
+class ScanIndex:
+    """Persistent SQLite record of what earlier runs already saw.
+
+    Files are keyed by folder and name and remembered with their inode,
+    size and mtime; a file whose three values are unchanged is not planned
+    again. Directories are remembered with their mtime and subdirectory
+    names, so ``organizer_scan.scan`` can skip listing any directory nothing
+    was added to or removed from since the last run.
+
+    Nothing is written until ``commit()``, which callers make only after a
+    run has been carried out; an interrupted run leaves the index as it was.
+    Only files still where they were seen are remembered, so a file that
+    was moved away is organized again if it ever comes back. Files whose
+    move failed must be passed to ``forget`` before the commit so the next
+    run tries them again.
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        import sqlite3
+
+        self.path = path
+        # The plan may be consumed on a worker thread; one thread at a time
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._folder = None
+        self._known = {}
+        self._files = {}
+        self._dirs = {}
+
+    def lookup_dir(self, path, mtime_ns):
+        """Cached subdirectory names of path, or None if it must be listed"""
+        row = self.db.execute("SELECT mtime_ns, subdirs FROM dirs WHERE path = ?",
+                              (path,)).fetchone()
+        if row is None or row[0] != mtime_ns:
+            return None
+        return json.loads(row[1])
+
+    def store_dir(self, path, mtime_ns, subdirs):
+        self._dirs[path] = (path, mtime_ns, json.dumps(subdirs))
+
+    def unseen(self, records):
+        """Yield only the records that are new or changed since the last run.
+
+        Records arrive grouped by folder from the scanner, so each folder's
+        known files are fetched with a single query.
+        """
+        for record in records:
+            folder = os.path.dirname(record.path)
+            if folder != self._folder:
+                self._folder = folder
+                self._known = {row[0]: tuple(row[1:]) for row in self.db.execute(
+                    "SELECT name, inode, size, mtime FROM files WHERE folder = ?",
+                    (folder,))}
+            if self._known.get(record.name) == (record.inode, record.size, record.mtime):
+                continue
+            self._files[record.path] = (folder, record.name, record.inode, record.size,
+                                        record.mtime)
+            yield record
+
+    def forget(self, path):
+        """Leave the file at path out of the commit, as if it was never seen.
+
+        Its folder is left out too, so the next run lists it again.
+        """
+        self._files.pop(path, None)
+        self._dirs.pop(os.path.dirname(path), None)
+
+    def commit(self):
+        """Write everything seen by this run in batched transactions.
+
+        Each file is checked on disk first: one that was moved (or changed)
+        since it was seen loses its row instead of keeping a stale one.
+        """
+        kept = []
+        gone = []
+        for path, entry in self._files.items():
+            try:
+                st = os.lstat(path)
+                stayed = (st.st_ino, st.st_size, st.st_mtime) == entry[2:]
+            except OSError:
+                stayed = False
+            if stayed:
+                kept.append(entry)
+            else:
+                gone.append(entry[:2])
+        with self.db:
+            for start in range(0, len(kept), WRITE_BATCH):
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                    kept[start:start + WRITE_BATCH])
+            for start in range(0, len(gone), WRITE_BATCH):
+                self.db.executemany("DELETE FROM files WHERE folder = ? AND name = ?",
+                                    gone[start:start + WRITE_BATCH])
+            self.db.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                                self._dirs.values())
+        self._files = {}
+        self._dirs = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+
+from organizer_log import log_dir
+from organizer_plan import PlannedMove
+
+JOURNAL_FILE = "organizer_journal.jsonl"
+# Copies to filesystems with coarse timestamps (FAT: 2 s) round the mtime
+MTIME_TOLERANCE = 2.0
+
+
+def default_journal_path():
+    """Where the app keeps the journal of its last run, next to its log"""
+    return os.path.join(log_dir(), JOURNAL_FILE)
+
+
+def plan_path(journal_path):
+    """Where a journaled run keeps the plan it is working through"""
+    return journal_path + ".plan"
+
+
+class MoveJournal:
+    """Append-only JSON Lines record of completed moves.
+
+    Lines are flushed and fsynced in batches (every ``batch_size`` moves or
+    ``sync_interval`` seconds, whichever comes first), so durability costs
+    one fsync per batch rather than one per file. After a crash at most the
+    last unsynced batch is missing; resume() detects those moves on disk.
+    """
+
+    def __init__(self, path, append=True, batch_size=256, sync_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.fp = open(path, 'a' if append else 'w')
+        if append and self.fp.tell() and not _ends_with_newline(path):
+            # Terminate a line torn by a crash so new entries stay readable
+            self.fp.write('\n')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, move):
+        line = json.dumps({"source": move.source, "destination": move.destination,
+                           "group": move.group, "size": move.size})
+        with self._lock:
+            self.fp.write(line + '\n')
+            self._unsynced += 1
+            if (self._unsynced >= self.batch_size
+                    or time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self.fp.closed:
+                self._sync()
+                self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as fp:
+        fp.seek(-1, os.SEEK_END)
+        return fp.read(1) == b'\n'
+
+
+def read_journal(path):
+    """Yield the PlannedMove entries committed to a journal.
+
+    A torn final line (the process died mid-write) is ignored.
+    """
+    with open(path, 'r') as fp:
+        for line in fp:
+            try:
+                data = json.loads(line)
+                yield PlannedMove(data["source"], data["destination"],
+                                  data.get("group", ""), data.get("size"))
+            except (ValueError, KeyError):
+                continue
+
+
+def resume(moves, journal):
+    """Yield the moves of a plan that the journal has not committed yet.
+
+    Moves that did happen but were lost with the last unsynced batch are
+    recognised on disk (source gone, the file found where it was planned to
+    go, see landed) and re-recorded instead of being retried. A move whose
+    file cannot be found is not recorded, so undo never touches a file the
+    run did not move.
+    """
+    done = set()
+    if os.path.exists(journal.path):
+        done = {entry.source for entry in read_journal(journal.path)}
+    for move in moves:
+        if move.source in done:
+            continue
+        if not os.path.lexists(move.source):
+            destination = landed(move)
+            if destination is not None:
+                journal.record(move._replace(destination=destination))
+            continue
+        yield move
+
+
+def landed(move):
+    """Where the file of a move that already happened is now, or None.
+
+    With the rename collision policy it may carry a numbered name
+    ("name (1).ext"), and the planned destination may hold a file that was
+    there before, so only a file matching the plan's size and mtime counts.
+    """
+    if move.size is None and move.mtime is None:
+        return None
+    folder, name = os.path.split(move.destination)
+    stem, extension = os.path.splitext(name)
+    candidate = move.destination
+    number = 0
+    while os.path.lexists(candidate):
+        if _matches(candidate, move):
+            return candidate
+        number += 1
+        candidate = os.path.join(folder, f"{stem} ({number}){extension}")
+    return None
+
+
+def _matches(path, move):
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if move.size is not None and st.st_size != move.size:
+        return False
+    return move.mtime is None or abs(st.st_mtime - move.mtime) <= MTIME_TOLERANCE
+
+
+def undo_moves(path):
+    """The moves that reverse a journaled run, newest first"""
+    moves = [PlannedMove(entry.destination, entry.source,
+                         os.path.basename(os.path.dirname(entry.source)), entry.size)
+             for entry in read_journal(path)]
+    moves.reverse()
+    return moves
+
+
+def prune_folders(moves):
+    """Remove the folders undone moves came from if they are now empty"""
+    folders = {os.path.dirname(move.source) for move in moves}
+    for folder in sorted(folders, key=len, reverse=True):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+
+def undo(path, report=None):
+    """Move every file recorded in the journal back; returns (restored, failed)"""
+    import shutil
+
+    report = report or (lambda message: None)
+    moves = undo_moves(path)
+    restored = failed = 0
+    for move in moves:
+        name = os.path.basename(move.source)
+        try:
+            if os.path.lexists(move.destination):
+                raise FileExistsError(f"{move.destination} already exists")
+            os.makedirs(os.path.dirname(move.destination), exist_ok=True)
+            shutil.move(move.source, move.destination)
+            restored += 1
+            report(f"Restored {name} to {move.group} folder")
+        except Exception as e:
+            failed += 1
+            report(f"Error restoring {name}: {str(e)}")
+    prune_folders(moves)
+    return restored, failed
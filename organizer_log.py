@@ -0,0 +1,129 @@
+import os
+import sys
+from datetime import datetime
+
+LOG_FILE = "organizer.log"
+LOG_CAPACITY = 10000
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+APP_NAME = "FileOrganizer"
+
+
+def log_dir():
+    """The per-user folder for log files on this platform.
+
+    Apps started from Finder or a desktop menu run in "/" or the home
+    folder, so the log cannot live in the current directory.
+    """
+    home = os.path.expanduser("~")
+    if sys.platform == "darwin":
+        return os.path.join(home, "Library", "Logs", APP_NAME)
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(home, "AppData", "Local")
+        return os.path.join(base, APP_NAME, "Logs")
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(home, ".local", "state")
+    return os.path.join(base, APP_NAME)
+
+
+def default_log_path():
+    return os.path.join(log_dir(), LOG_FILE)
+
+
+class StatusLog:
+    """Fixed-size, in-memory tail of the status messages, mirrored to disk.
+
+    Lines live in a ring buffer of ``capacity`` slots, so memory stays flat
+    however long a run is and a line is found by index in constant time.
+    ``total`` counts every line ever added, which lets a view tell that the
+    tail moved. With a ``path`` every line is also appended to a log file
+    that rotates to ``path.1`` ... ``path.N`` past ``max_bytes``; a batch of
+    lines is one write. If the file cannot be written, the error is added
+    as a line of its own, kept in ``write_error``, and mirroring stops.
+    """
+
+    def __init__(self, capacity=LOG_CAPACITY, path=None, max_bytes=LOG_MAX_BYTES,
+                 backups=LOG_BACKUPS):
+        self.capacity = max(1, capacity)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.total = 0
+        self._lines = [None] * self.capacity
+        self._count = 0
+        self._fp = None
+        self._size = 0
+        self.write_error = None
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        """The index-th line still held, oldest first"""
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._lines[(self.total - self._count + index) % self.capacity]
+
+    def lines(self, start, count):
+        return [self[i] for i in range(max(0, start), min(self._count, start + count))]
+
+    def append(self, message):
+        self.extend([message])
+
+    def extend(self, messages):
+        """Add messages, stamped with the current time"""
+        stamp = datetime.now().strftime('%H:%M:%S')
+        lines = [f"{stamp} - {message}" for message in messages]
+        self._hold(lines)
+        if self.path is not None and lines:
+            try:
+                self._write('\n'.join(lines) + '\n')
+            except OSError as e:
+                path, self.path = self.path, None
+                self.write_error = e
+                self.close()
+                self._hold([f"{stamp} - Could not write {path}: {str(e)}; "
+                            "messages are no longer saved to a file"])
+
+    def _hold(self, lines):
+        # Lines beyond capacity would be overwritten at once; skip them
+        self.total += max(0, len(lines) - self.capacity)
+        for line in lines[-self.capacity:]:
+            self._lines[self.total % self.capacity] = line
+            self.total += 1
+        self._count = min(self.capacity, self._count + len(lines))
+
+    def clear(self):
+        """Forget the lines held in memory; the log file keeps them"""
+        self._lines = [None] * self.capacity
+        self._count = 0
+
+    def _write(self, text):
+        if self._fp is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fp = open(self.path, 'a', encoding='utf-8')
+            self._size = self._fp.tell()
+        self._fp.write(text)
+        self._fp.flush()
+        self._size += len(text)
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._fp.close()
+        self._fp = None
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def close(self):
+        fp, self._fp = self._fp, None
+        if fp is not None:
+            try:
+                fp.close()
+            except OSError:
+                pass
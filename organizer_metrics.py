@@ -0,0 +1,192 @@
+import errno
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+PHASES = ("scan", "classify", "mkdir", "move", "copy", "journal", "extract")
+# Upper bounds, in seconds, of the timing histogram buckets
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5,
+           1.0, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class _Timer:
+    __slots__ = ("metrics", "phase", "start")
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Counters, per-phase timing histograms and errors for organize runs.
+
+    Engines, movers, destination caches and workers take an optional
+    ``metrics``; they time their phases (see PHASES) with ``timer`` and
+    count outcomes with ``count``. Updates take a lock, so one Metrics can
+    be shared by a pool of movers. ``write`` exports a snapshot as JSON or,
+    for a ``.prom`` path, in the Prometheus text format.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.errors = Counter()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, phase):
+        """Context manager adding the time spent inside it to phase"""
+        return _Timer(self, phase)
+
+    def timed(self, iterable, phase):
+        """Yield from iterable, timing the production of every item"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(phase, time.perf_counter() - start)
+            yield item
+
+    def error(self, phase, exc):
+        """Count an error by phase and errno name (or exception type)"""
+        code = getattr(exc, "errno", None)
+        name = errno.errorcode.get(code, str(code)) if code else type(exc).__name__
+        with self._lock:
+            self.errors[(phase, name)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed": time.time() - self.started,
+                "counters": dict(self.counters),
+                "phases": {phase: {"count": h.count, "seconds": h.total,
+                                   "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"],
+                                                       h.counts))}
+                           for phase, h in self.histograms.items()},
+                "errors": [{"phase": phase, "errno": name, "count": count}
+                           for (phase, name), count in self.errors.items()],
+            }
+
+    def prometheus(self):
+        """The snapshot in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE organizer_{name}_total counter")
+                lines.append(f"organizer_{name}_total {value}")
+            lines.append("# TYPE organizer_phase_seconds histogram")
+            for phase, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), h.counts):
+                    cumulative += count
+                    lines.append(f'organizer_phase_seconds_bucket{{phase="{phase}",'
+                                 f'le="{bound}"}} {cumulative}')
+                lines.append(f'organizer_phase_seconds_sum{{phase="{phase}"}} {h.total}')
+                lines.append(f'organizer_phase_seconds_count{{phase="{phase}"}} {h.count}')
+            lines.append("# TYPE organizer_errors_total counter")
+            for (phase, name), count in sorted(self.errors.items()):
+                lines.append(f'organizer_errors_total{{phase="{phase}",errno="{name}"}} '
+                             f'{count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Export to path, atomically; Prometheus text for .prom, else JSON"""
+        if path.endswith(".prom"):
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=4)
+        partial = path + ".tmp"
+        with open(partial, 'w') as f:
+            f.write(text)
+        os.replace(partial, path)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class NullMetrics:
+    """Default metrics sink that records nothing and costs next to nothing"""
+
+    enabled = False
+    _timer = _NullTimer()
+
+    def count(self, name, amount=1):
+        pass
+
+    def observe(self, phase, seconds):
+        pass
+
+    def timer(self, phase):
+        return self._timer
+
+    def timed(self, iterable, phase):
+        return iterable
+
+    def error(self, phase, exc):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+@contextmanager
+def profiled(path):
+    """Run the body under cProfile and save the stats to path (see pstats)"""
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
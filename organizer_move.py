@@ -0,0 +1,142 @@
+import errno
+import os
+import threading
+
+from organizer_metrics import NULL_METRICS
+
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+COPY_WORKERS = 2
+
+
+class ChecksumMismatch(OSError):
+    pass
+
+
+class Mover:
+    """Moves files with a rename when possible and a copy pipeline otherwise.
+
+    The device of every source and destination folder is looked up once and
+    cached (files always share their folder's device), so choosing between
+    the two paths costs no per-file stat. Same-device moves are a single
+    atomic ``os.replace``. Cross-device moves copy through the kernel with
+    ``copy_file_range``/``sendfile`` into a temporary file, optionally verify
+    a checksum, then rename it into place and delete the source. At most
+    ``copy_workers`` copies run at once, however many movers call in.
+    Renames and copies are timed as the "move" and "copy" phases of the
+    optional ``metrics``.
+    """
+
+    def __init__(self, copy_workers=COPY_WORKERS, buffer_size=COPY_BUFFER_SIZE,
+                 verify=False, metrics=None):
+        self.buffer_size = buffer_size
+        self.verify = verify
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self._devices = {}
+        self._copy_slots = threading.BoundedSemaphore(max(1, copy_workers))
+
+    def device(self, folder):
+        dev = self._devices.get(folder)
+        if dev is None:
+            dev = self._devices[folder] = os.stat(folder).st_dev
+        return dev
+
+    def same_device(self, source, destination):
+        return (self.device(os.path.dirname(source))
+                == self.device(os.path.dirname(destination)))
+
+    def move(self, source, destination):
+        if self.same_device(source, destination):
+            try:
+                with self.metrics.timer("move"):
+                    os.replace(source, destination)
+                return destination
+            except OSError as e:
+                # Bind mounts can share st_dev and still refuse a rename
+                if e.errno != errno.EXDEV:
+                    raise
+        with self._copy_slots, self.metrics.timer("copy"):
+            self.copy_across(source, destination)
+        return destination
+
+    def copy_across(self, source, destination):
+        import shutil
+
+        folder, name = os.path.split(destination)
+        partial = os.path.join(folder, f".{name}.part")
+        try:
+            copied = copy_file(source, partial, self.buffer_size)
+            if self.verify and file_digest(source) != file_digest(partial):
+                raise ChecksumMismatch(errno.EIO, f"Checksum mismatch copying {source}")
+            shutil.copystat(source, partial)
+            os.replace(partial, destination)
+            self.metrics.count("bytes_copied", copied)
+        except BaseException:
+            try:
+                os.unlink(partial)
+            except OSError:
+                pass
+            raise
+        os.unlink(source)
+
+
+def copy_file(source, destination, buffer_size=COPY_BUFFER_SIZE):
+    """Copy file contents, letting the kernel do the work where it can.
+
+    Returns the size of the source.
+    """
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        for copy in (_copy_file_range, _sendfile):
+            try:
+                if copy(src.fileno(), dst.fileno(), size, buffer_size):
+                    return size
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                   errno.ENOTSUP, errno.EOPNOTSUPP):
+                    raise
+            # Nothing was written, or it is safe to start again from the top
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+        import shutil
+
+        shutil.copyfileobj(src, dst, buffer_size)
+    return size
+
+
+def _copy_file_range(src, dst, size, buffer_size):
+    if not hasattr(os, "copy_file_range"):
+        return False
+    return _kernel_copy(lambda offset: os.copy_file_range(src, dst, buffer_size),
+                        size)
+
+
+def _sendfile(src, dst, size, buffer_size):
+    if not hasattr(os, "sendfile"):
+        return False
+    return _kernel_copy(lambda offset: os.sendfile(dst, src, offset, buffer_size),
+                        size)
+
+
+def _kernel_copy(step, size):
+    offset = 0
+    while offset < size:
+        sent = step(offset)
+        if sent == 0:
+            break
+        offset += sent
+    return True
+
+
+def file_digest(path, buffer_size=COPY_BUFFER_SIZE):
+    import hashlib
+
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(buffer_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Used by module-level move_to, e.g. inside process pool workers
+default_mover = Mover()
@@ -0,0 +1,185 @@
+import os
+import re
+import threading
+
+from organizer_dirs import DestinationCache
+from organizer_plan import read_plan
+from organizer_worker import OrganizeWorker
+
+# Concurrent moves allowed per device, by kind of device
+DEVICE_LIMITS = {"ssd": 16, "hdd": 2, "network": 4, "unknown": 4}
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "afs", "9p", "ceph",
+                       "glusterfs", "fuse.sshfs", "fuse.glusterfs", "davfs"}
+# The kernel writes space, tab, newline and backslash in mount points as \NNN
+MOUNT_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+
+def mount_type(path):
+    """Filesystem type of the mount holding path, from /proc/self/mounts"""
+    path = os.path.realpath(path)
+    best, best_type = "", None
+    try:
+        with open("/proc/self/mounts", 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = MOUNT_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)),
+                                               fields[1])
+                inside = (path == mount_point
+                          or path.startswith(mount_point.rstrip('/') + '/'))
+                if inside and len(mount_point) >= len(best):
+                    best, best_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return best_type
+
+
+def device_kind(path):
+    """"ssd", "hdd", "network" or "unknown" for the device holding path"""
+    if mount_type(path) in NETWORK_FILESYSTEMS:
+        return "network"
+    dev = os.stat(path).st_dev
+    block = os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+    # Partitions keep their queue settings on the parent disk
+    for folder in (block, os.path.dirname(block)):
+        try:
+            with open(os.path.join(folder, "queue", "rotational"), 'r') as f:
+                return "hdd" if f.read().strip() == "1" else "ssd"
+        except OSError:
+            continue
+    return "unknown"
+
+
+class RootProgress:
+    __slots__ = ("moved", "failed", "skipped", "finished")
+
+    def __init__(self):
+        self.moved = self.failed = self.skipped = 0
+        self.finished = False
+
+
+class MultiRootJob:
+    """Organizes several folders in one job, scheduled per storage device.
+
+    Roots are grouped by ``st_dev``. Each device gets its own scheduler
+    thread, which runs its roots one after another, each through an
+    OrganizeWorker with as many movers as suit the device's kind (see
+    DEVICE_LIMITS), so SSDs move many files at once while spinning disks
+    and network mounts see only a few concurrent requests. The roots of a
+    device share one DestinationCache. Completed moves are recorded in the
+    optional MoveJournal. ``plan`` names a plan file (see organizer_plan)
+    to take the moves from instead of scanning; each move goes with the
+    innermost root holding its source.
+
+    Per-root counts are kept in ``self.progress`` as each root finishes;
+    ``snapshot()`` reads them safely while the job runs.
+    """
+
+    def __init__(self, engine, roots, method="extension", limits=None, journal=None,
+                 plan=None, **scan_options):
+        self.engine = engine
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.method = method
+        self.limits = dict(DEVICE_LIMITS, **(limits or {}))
+        self.journal = journal
+        self.plan = plan
+        self.scan_options = scan_options
+        self.progress = {root: RootProgress() for root in self.roots}
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._cancelled = threading.Event()
+
+    def devices(self):
+        """{st_dev: [roots]} in the order the roots were given"""
+        groups = {}
+        for root in self.roots:
+            if not os.path.isdir(root):
+                raise NotADirectoryError(f"Not a folder: {root}")
+            groups.setdefault(os.stat(root).st_dev, []).append(root)
+        return groups
+
+    def run(self):
+        """Organize every root; returns (moved, failed) over all of them.
+
+        On KeyboardInterrupt the running workers are cancelled and waited
+        for, so every finished move is journaled, and the interrupt is
+        raised again.
+        """
+        threads = []
+        for roots in self.devices().values():
+            kind = device_kind(roots[0])
+            limit = max(1, self.limits.get(kind, DEVICE_LIMITS["unknown"]))
+            self.engine.report(f"{', '.join(roots)}: {kind} device, {limit} movers")
+            thread = threading.Thread(target=self._run_device, args=(roots, limit),
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.cancel()
+            for thread in threads:
+                thread.join()
+            raise
+        totals = self.snapshot().values()
+        return sum(p[0] for p in totals), sum(p[1] for p in totals)
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            for worker in self._workers:
+                worker.cancel()
+
+    def snapshot(self):
+        """{root: (moved, failed, skipped, finished)}"""
+        with self._lock:
+            return {root: (p.moved, p.failed, p.skipped, p.finished)
+                    for root, p in self.progress.items()}
+
+    def _run_device(self, roots, limit):
+        folders = DestinationCache(self.engine.metrics)
+        for root in roots:
+            if self._cancelled.is_set():
+                break
+            worker = OrganizeWorker(self._moves(root), workers=limit, journal=self.journal,
+                                    mover=self.engine.mover,
+                                    collision_policy=self.engine.collision_policy,
+                                    metrics=self.engine.metrics, folders=folders)
+            with self._lock:
+                self._workers.add(worker)
+            # A cancel that came before the worker was registered still counts
+            if self._cancelled.is_set():
+                worker.cancel()
+            worker.start()
+            while True:
+                kind, payload = worker.progress.get()
+                if kind == "done":
+                    break
+                self.engine.report(f"{root}: {payload}")
+            moved, failed, _ = payload
+            with self._lock:
+                self._workers.discard(worker)
+                progress = self.progress[root]
+                progress.moved, progress.failed = moved, failed
+                progress.skipped = worker.skipped
+                progress.finished = True
+
+    def _moves(self, root):
+        if self.plan is None:
+            yield from self.engine.plan(root, self.method, **self.scan_options)
+            return
+        with open(self.plan, 'r') as fp:
+            for move in read_plan(fp):
+                if self._root_of(move.source) == root:
+                    yield move
+
+    def _root_of(self, path):
+        """The innermost root holding path, or None"""
+        best = None
+        for root in self.roots:
+            inside = path.startswith(root.rstrip(os.sep) + os.sep)
+            if inside and (best is None or len(root) > len(best)):
+                best = root
+        return best
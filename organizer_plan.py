@@ -0,0 +1,35 @@
+import json
+import os
+from collections import namedtuple
+
+# size and mtime are None when the plan was made without stat info
+PlannedMove = namedtuple("PlannedMove", "source destination group size mtime",
+                         defaults=(None,))
+
+
+def write_plan(moves, fp):
+    """Stream moves to fp as JSON Lines; returns the number written"""
+    count = 0
+    for move in moves:
+        fp.write(json.dumps(move._asdict()) + '\n')
+        count += 1
+    return count
+
+
+def read_plan(fp):
+    """Yield PlannedMove records from a JSON Lines plan, one line at a time"""
+    for line_number, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            yield PlannedMove(data["source"], data["destination"],
+                              data.get("group", ""), data.get("size"), data.get("mtime"))
+        except (ValueError, KeyError) as e:
+            raise ValueError(f"Invalid plan entry on line {line_number}: {str(e)}")
+
+
+def describe(move):
+    """One human-readable line for a dry run"""
+    return f"Would move {os.path.basename(move.source)} to {move.group} folder"
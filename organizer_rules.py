@@ -0,0 +1,213 @@
+import re
+import fnmatch
+import time
+from bisect import bisect_right
+
+SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3, "tb": 1024 ** 4}
+DAY = 86400
+RULE_KEYS = {"group", "extensions", "name", "regex", "min_size", "max_size",
+             "older_than_days", "newer_than_days", "magic"}
+
+
+def parse_size(value):
+    """Bytes from an int or a string such as "10MB" or "1.5 gb" """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", str(value))
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+class RangeTable:
+    """Sorted threshold table mapping a number to the rules it satisfies.
+
+    Every rule contributes an optional [low, high) range. The distinct range
+    edges split the number line into intervals, and each interval stores the
+    bitmask of rules it satisfies, so a lookup is one bisect.
+    """
+
+    def __init__(self, ranges, all_rules):
+        edges = sorted({edge for low, high in ranges.values()
+                        for edge in (low, high) if edge is not None})
+        self.edges = edges
+        self.masks = []
+        unconstrained = all_rules
+        for bit in ranges:
+            unconstrained &= ~bit
+        self.unconstrained = unconstrained
+        # One representative point per interval decides its mask
+        points = [edges[0] - 1] if edges else [0]
+        points += edges
+        for point in points:
+            mask = unconstrained
+            for bit, (low, high) in ranges.items():
+                if (low is None or point >= low) and (high is None or point < high):
+                    mask |= bit
+            self.masks.append(mask)
+
+    def lookup(self, value):
+        if value is None:
+            return self.unconstrained
+        return self.masks[bisect_right(self.edges, value)]
+
+
+class RuleSet:
+    """Ordered rules from organizer_config.json compiled into one matcher.
+
+    Each rule names a group and any mix of predicates: ``extensions``,
+    ``name`` (glob), ``regex``, ``min_size``/``max_size``,
+    ``older_than_days``/``newer_than_days`` and ``magic`` (hex header
+    prefixes). The first rule whose predicates all hold wins.
+
+    Rules are bits in an int. Extensions are one dict lookup per suffix,
+    sizes and ages one bisect each into a threshold table, and all name
+    patterns one combined regex; ANDing the masks leaves only the candidate
+    rules, so the cost per file barely grows with the number of rules. The
+    file header is read, once and only ``header_size`` bytes, only when a
+    surviving candidate checks magic bytes.
+    """
+
+    def __init__(self, rules):
+        self.groups = []
+        self.count = len(rules)
+        all_rules = (1 << self.count) - 1
+        self.needs_stat = False
+
+        extension_masks = {}
+        self.no_extension_rules = 0
+        self.max_parts = 1
+        sizes = {}
+        ages = {}
+        self.name_patterns = {}
+        self.magic = {}
+        self.header_size = 0
+        alternatives = []
+
+        for position, rule in enumerate(rules):
+            bit = 1 << position
+            if not isinstance(rule, dict) or not rule.get("group"):
+                raise ValueError(f"Rule {position + 1} needs a group")
+            unknown = set(rule) - RULE_KEYS
+            if unknown:
+                raise ValueError(f"Rule {position + 1} has unknown keys: "
+                                 f"{', '.join(sorted(unknown))}")
+            self.groups.append(rule["group"])
+
+            if rule.get("extensions"):
+                for extension in _as_list(rule["extensions"]):
+                    extension = extension.strip().lstrip('.').lower()
+                    for key in (extension, extension.upper()):
+                        extension_masks[key] = extension_masks.get(key, 0) | bit
+                    self.max_parts = max(self.max_parts, extension.count('.') + 1)
+            else:
+                self.no_extension_rules |= bit
+
+            patterns = [fnmatch.translate(p) for p in _as_list(rule.get("name", []))]
+            patterns += [f"(?:{p})\\Z" for p in _as_list(rule.get("regex", []))]
+            if patterns:
+                try:
+                    compiled = re.compile('|'.join(f"(?:{p})" for p in patterns))
+                except re.error as e:
+                    raise ValueError(f"Rule {position + 1} has a bad pattern: {e}")
+                self.name_patterns[bit] = compiled
+                alternatives.append(f"(?P<r{position}>{compiled.pattern})")
+
+            if "min_size" in rule or "max_size" in rule:
+                low = parse_size(rule["min_size"]) if "min_size" in rule else None
+                high = parse_size(rule["max_size"]) + 1 if "max_size" in rule else None
+                sizes[bit] = (low, high)
+                self.needs_stat = True
+
+            if "older_than_days" in rule or "newer_than_days" in rule:
+                low = float(rule["older_than_days"]) * DAY if "older_than_days" in rule else None
+                high = float(rule["newer_than_days"]) * DAY if "newer_than_days" in rule else None
+                ages[bit] = (low, high)
+                self.needs_stat = True
+
+            if rule.get("magic"):
+                try:
+                    prefixes = tuple(bytes.fromhex(m) for m in _as_list(rule["magic"]))
+                except ValueError:
+                    raise ValueError(f"Rule {position + 1} has bad magic hex")
+                self.magic[bit] = prefixes
+                self.header_size = max([self.header_size] + [len(p) for p in prefixes])
+
+        self.extension_masks = extension_masks
+        self.name_rules = 0
+        for bit in self.name_patterns:
+            self.name_rules |= bit
+        self.combined = None
+        if alternatives:
+            try:
+                self.combined = re.compile('|'.join(alternatives))
+            except re.error:
+                # Patterns that cannot be joined (clashing group names) are
+                # still checked one by one below
+                pass
+        self.sizes = RangeTable(sizes, all_rules)
+        self.ages = RangeTable(ages, all_rules)
+
+    def __bool__(self):
+        return self.count > 0
+
+    def match(self, name, path=None, size=None, mtime=None, now=None):
+        """Group of the first rule that matches, or None"""
+        if not self.count:
+            return None
+        candidates = self.no_extension_rules
+        if self.extension_masks:
+            parts = name.lstrip('.').split('.')
+            for count in range(min(self.max_parts, len(parts) - 1), 0, -1):
+                extension = '.'.join(parts[-count:])
+                mask = self.extension_masks.get(extension)
+                if mask is None:
+                    mask = self.extension_masks.get(extension.lower(), 0)
+                candidates |= mask
+        if not candidates:
+            return None
+        candidates &= self.sizes.lookup(size)
+        if mtime is not None:
+            age = (now if now is not None else time.time()) - mtime
+            candidates &= self.ages.lookup(age)
+        else:
+            candidates &= self.ages.unconstrained
+        if candidates & self.name_rules and self.combined is not None:
+            found = self.combined.match(name)
+            if found is None:
+                candidates &= ~self.name_rules
+            else:
+                # The combined regex reports the earliest name rule that matches
+                first = int(found.lastgroup[1:])
+                below = (1 << first) - 1
+                candidates &= ~(self.name_rules & below)
+
+        header = None
+        while candidates:
+            bit = candidates & -candidates
+            candidates ^= bit
+            pattern = self.name_patterns.get(bit)
+            if pattern is not None and not pattern.match(name):
+                continue
+            prefixes = self.magic.get(bit)
+            if prefixes is not None:
+                if header is None:
+                    header = read_header(path, self.header_size)
+                if not header.startswith(prefixes):
+                    continue
+            return self.groups[bit.bit_length() - 1]
+        return None
+
+
+def read_header(path, size):
+    if path is None:
+        return b''
+    try:
+        with open(path, 'rb') as f:
+            return f.read(size)
+    except OSError:
+        return b''
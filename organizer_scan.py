@@ -0,0 +1,96 @@
+import os
+import re
+import fnmatch
+from collections import namedtuple
+
+# size, mtime, dev and inode are None when scanning with stat=False
+FileRecord = namedtuple("FileRecord", "path name size mtime dev inode depth")
+
+
+def compile_patterns(patterns):
+    """Combine glob patterns into one compiled regex, or None if there are none"""
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return re.compile('|'.join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+
+def scan(root, recursive=False, max_depth=None, include=None, exclude=None,
+         stat=True, dir_cache=None, hidden=False):
+    """Yield a FileRecord for every regular file under root, lazily.
+
+    Entries come straight from ``os.scandir`` so the file type check costs no
+    extra syscall, and stat info is taken once from the cached ``DirEntry``.
+    Only one directory handle is open at a time; subdirectories are queued
+    and visited after the current one, so memory stays flat however large a
+    single directory is.
+
+    ``include``/``exclude`` are glob patterns matched against file names;
+    ``exclude`` also prunes directories. ``max_depth`` limits recursion
+    (0 means only root itself). Hidden files and folders (names starting
+    with a dot, like ``.DS_Store``) are skipped unless ``hidden`` is true.
+
+    With a ``dir_cache`` (see organizer_index.ScanIndex) each directory is
+    stat'ed first; one whose mtime matches the cache is not listed at all,
+    and the walk continues into the subdirectories the cache remembers.
+    """
+    include = compile_patterns(include)
+    exclude = compile_patterns(exclude)
+    if max_depth is None:
+        max_depth = -1 if recursive else 0
+
+    pending = [(os.fspath(root), 0)]
+    while pending:
+        directory, depth = pending.pop()
+        subdirs = None
+        if dir_cache is not None:
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            subdirs = dir_cache.lookup_dir(directory, mtime)
+
+        if subdirs is None:
+            subdirs = []
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(name)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                    except OSError:
+                        continue
+                    if not hidden and name.startswith('.'):
+                        continue
+                    if include and not include.match(name):
+                        continue
+                    if exclude and exclude.match(name):
+                        continue
+                    if stat:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        yield FileRecord(entry.path, name, st.st_size, st.st_mtime,
+                                         st.st_dev, st.st_ino, depth)
+                    else:
+                        yield FileRecord(entry.path, name, None, None, None, None, depth)
+            if dir_cache is not None:
+                dir_cache.store_dir(directory, mtime, subdirs)
+
+        if depth == max_depth:
+            continue
+        for name in reversed(subdirs):
+            if not hidden and name.startswith('.'):
+                continue
+            if exclude and exclude.match(name):
+                continue
+            pending.append((os.path.join(directory, name), depth + 1))
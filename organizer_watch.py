@@ -0,0 +1,229 @@
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+
+from organizer_scan import FileRecord, compile_patterns
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+EVENT_HEADER = struct.Struct("iIII")
+
+DEBOUNCE_SECONDS = 2.0
+POLL_INTERVAL = 5.0
+# Longest sleep between checks, so stop requests are noticed promptly
+MAX_WAIT = 1.0
+
+
+class InotifyWatcher:
+    """Reports files in a folder that were closed after writing or moved in.
+
+    Those events mean a writer is done with the file, so no size/mtime
+    stability check is needed after the debounce period.
+    """
+
+    signals_complete_writes = True
+
+    def __init__(self, folder):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        watch = libc.inotify_add_watch(self.fd, os.fsencode(folder),
+                                       IN_CLOSE_WRITE | IN_MOVED_TO)
+        if watch < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"Cannot watch {folder}")
+        self.overflowed = False
+
+    def wait(self, timeout):
+        """Names of files with events within timeout seconds (may be empty)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        names = set()
+        if not ready:
+            return names
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; the caller should sweep the folder
+                self.overflowed = True
+            elif length:
+                name = data[offset:offset + length].rstrip(b'\0')
+                names.add(os.fsdecode(name))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback that lists the folder every interval and reports changes.
+
+    Polling cannot tell when a writer is done, so callers wait for the size
+    and mtime to stop changing.
+    """
+
+    signals_complete_writes = False
+
+    def __init__(self, folder, interval=POLL_INTERVAL):
+        self.folder = folder
+        self.interval = interval
+        self.overflowed = False
+        self._next_poll = 0.0
+        self._seen = {}
+
+    def wait(self, timeout):
+        delay = self._next_poll - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout if timeout is not None else delay))
+            if time.monotonic() < self._next_poll:
+                return set()
+        self._next_poll = time.monotonic() + self.interval
+        seen = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            seen[entry.name] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            return set()
+        changed = {name for name, signature in seen.items()
+                   if self._seen.get(name) != signature}
+        self._seen = seen
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(folder, poll=False, poll_interval=POLL_INTERVAL):
+    """An inotify watcher where the platform has one, else a polling watcher"""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folder, poll_interval)
+
+
+class FolderWatch:
+    """Organizes files in a folder as they arrive, until stopped.
+
+    Events are debounced per file: a file is handled only once it has been
+    quiet for ``debounce`` seconds and, without inotify, its size and mtime
+    have stayed the same across that period. Ready files are planned with
+    the engine's usual rules and moved in one batch. Between arrivals the
+    loop just blocks on the watcher. Hidden files are left alone unless
+    ``hidden`` is true.
+    """
+
+    def __init__(self, engine, folder_path, method="extension", debounce=DEBOUNCE_SECONDS,
+                 poll=False, poll_interval=POLL_INTERVAL, include=None, exclude=None,
+                 journal=None, hidden=False):
+        self.engine = engine
+        self.folder_path = os.path.abspath(folder_path)
+        self.method = method
+        self.debounce = debounce
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.journal = journal
+        self.hidden = hidden
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, sweep=True):
+        """Watch until stop() is called; sweep first organizes what is already there"""
+        if not os.path.isdir(self.folder_path):
+            raise NotADirectoryError(f"Not a folder: {self.folder_path}")
+        watcher = open_watcher(self.folder_path, self.poll, self.poll_interval)
+        kind = "inotify" if watcher.signals_complete_writes else "polling"
+        self.engine.report(f"Watching {self.folder_path} ({kind})")
+        if sweep:
+            self.sweep()
+        pending = {}
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                timeout = MAX_WAIT
+                if pending:
+                    soonest = min(deadline for deadline, _ in pending.values())
+                    timeout = min(MAX_WAIT, max(0.0, soonest - now))
+                for name in watcher.wait(timeout):
+                    if self.wanted(name):
+                        signature = pending.get(name, (0, None))[1]
+                        pending[name] = (time.monotonic() + self.debounce, signature)
+                if watcher.overflowed:
+                    watcher.overflowed = False
+                    self.sweep()
+                ready = self.settle(pending, watcher.signals_complete_writes)
+                if ready:
+                    self.engine.execute(
+                        self.engine.plan_records(self.folder_path, ready, self.method),
+                        self.journal)
+        finally:
+            watcher.close()
+
+    def wanted(self, name):
+        # Hidden files such as .DS_Store are recreated as soon as they are moved
+        if not self.hidden and name.startswith('.'):
+            return False
+        if self.include and not self.include.match(name):
+            return False
+        return not (self.exclude and self.exclude.match(name))
+
+    def settle(self, pending, complete_writes):
+        """Take the files that have gone quiet out of pending, as FileRecords"""
+        now = time.monotonic()
+        ready = []
+        for name, (deadline, signature) in list(pending.items()):
+            if deadline > now:
+                continue
+            path = os.path.join(self.folder_path, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                del pending[name]
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                del pending[name]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if complete_writes or current == signature:
+                del pending[name]
+                ready.append(FileRecord(path, name, st.st_size, st.st_mtime,
+                                        st.st_dev, st.st_ino, 0))
+            else:
+                pending[name] = (now + self.debounce, current)
+        return ready
+
+    def sweep(self):
+        """Organize everything already in the folder"""
+        moves = (move for move in self.engine.plan(self.folder_path, self.method,
+                                                    hidden=self.hidden)
+                 if self.wanted(os.path.basename(move.source)))
+        return self.engine.execute(moves, self.journal)
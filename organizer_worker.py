@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+
+from organizer_dirs import DestinationCache
+from organizer_engine import count_outcome, move_to, outcome_message, prepare_move
+from organizer_metrics import NULL_METRICS
+
+# Pool classes from concurrent.futures, imported when a run starts
+EXECUTORS = {
+    "thread": "ThreadPoolExecutor",
+    # Processes help when most moves are cross-device copies
+    "process": "ProcessPoolExecutor",
+}
+
+
+class OrganizeWorker:
+    """Applies a move plan on a background thread with a pool of movers.
+
+    ``moves`` is any iterable of PlannedMove, typically the generator from
+    ``OrganizerEngine.plan``; it is consumed lazily on the worker thread.
+    Completed moves are recorded in the optional MoveJournal.
+
+    Progress is posted to ``self.progress`` as ``(kind, payload)`` tuples:
+    ``("status", message)`` for each file and a single
+    ``("done", (moved, failed, cancelled))`` when the run ends. The caller
+    drains the queue at whatever rate suits it (the Tk app does it at 10 Hz).
+    Outcomes, errors and journal timings go to the optional ``metrics``;
+    ``skipped`` counts the files the collision policy left in place.
+    Pass ``folders`` (a DestinationCache) to share claimed destination names
+    with an earlier stage of the plan. ``on_failure(move)`` is called on the
+    worker thread for every move that could not be applied.
+    """
+
+    def __init__(self, moves, workers=4, executor="thread", journal=None, mover=None,
+                 collision_policy="rename", metrics=None, folders=None, on_failure=None):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor: {executor}")
+        self.moves = moves
+        self.workers = max(1, workers)
+        self.executor = executor
+        self.journal = journal
+        self.collision_policy = collision_policy
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.folders = folders
+        self.on_failure = on_failure
+        # Process pools cannot share a Mover; each process uses its default one
+        self.move = move_to if executor == "process" or mover is None else mover.move
+        self.progress = queue.Queue()
+        self.skipped = 0
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # A paused run has to wake up to notice the cancel
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        import concurrent.futures
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        moved = failed = 0
+        folders = self.folders
+        if folders is None:
+            folders = DestinationCache(self.metrics)
+        try:
+            pool_class = getattr(concurrent.futures, EXECUTORS[self.executor])
+            with pool_class(max_workers=self.workers) as pool:
+                pending = {}
+                try:
+                    for move in self.moves:
+                        self._running.wait()
+                        if self._cancelled.is_set():
+                            break
+                        # Folders and names are settled here, on one thread, so
+                        # movers never race for the same destination
+                        try:
+                            move, action = prepare_move(move, folders,
+                                                        self.collision_policy)
+                        except OSError as e:
+                            failed += 1
+                            self._report_error(move, e)
+                            continue
+                        if action == "skip":
+                            self.skipped += 1
+                            count_outcome(self.metrics, move, action)
+                            self.progress.put(("status", outcome_message(move, action)))
+                            continue
+                        if action == "duplicate":
+                            future = pool.submit(os.remove, move.source)
+                        else:
+                            future = pool.submit(self.move, move.source, move.destination)
+                        pending[future] = (move, action)
+                        # Keep the backlog bounded instead of queueing every file
+                        if len(pending) >= self.workers * 4:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            m, f = self._collect(done, pending)
+                            moved += m
+                            failed += f
+                finally:
+                    # Moves already handed to the pool finish either way, so they
+                    # are counted and journaled even if the plan raised
+                    m, f = self._collect(pending, pending)
+                    moved += m
+                    failed += f
+        except Exception as e:
+            self.progress.put(("status", f"An error occurred: {str(e)}"))
+        self.progress.put(("done", (moved, failed, self._cancelled.is_set())))
+
+    def _collect(self, futures, pending):
+        moved = failed = 0
+        for future in list(futures):
+            move, action = pending.pop(future)
+            try:
+                future.result()
+                if self.journal is not None and action != "duplicate":
+                    with self.metrics.timer("journal"):
+                        self.journal.record(move)
+                count_outcome(self.metrics, move, action)
+                moved += 1
+                self.progress.put(("status", outcome_message(move, action)))
+            except Exception as e:
+                failed += 1
+                self._report_error(move, e)
+        return moved, failed
+
+    def _report_error(self, move, error):
+        if self.on_failure is not None:
+            self.on_failure(move)
+        self.metrics.count("files_failed")
+        self.metrics.error("move", error)
+        name = os.path.basename(move.source)
+        self.progress.put(("status", f"Error moving {name}: {str(error)}"))
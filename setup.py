@@ -1,3 +1,5 @@
+import sys
+
 from setuptools import setup
 
 APP = ['file_organizer.py']
@@ -14,11 +16,29 @@ OPTIONS = {
         'NSHighResolutionCapable': 'True',
     }
 }
+# py2app is only needed to build the macOS bundle (python setup.py py2app);
+# pip installs get the console and GUI scripts without it
+APP_OPTIONS = {
+    'app': APP,
+    'options': {'py2app': OPTIONS},
+    'setup_requires': ['py2app'],
+} if 'py2app' in sys.argv else {}
 
 setup(
     name="FileOrganizer",
-    app=APP,
+    py_modules=['file_organizer', 'organizer_engine', 'organizer_cli',
+                'organizer_worker', 'organizer_scan', 'organizer_plan',
+                'organizer_journal', 'organizer_dirs', 'organizer_move',
+                'organizer_dedup', 'organizer_index', 'organizer_watch',
+                'organizer_rules', 'organizer_multi', 'organizer_metrics',
+                'organizer_log', 'organizer_dates', 'organizer_async',
+                'organizer_config', 'organizer_archive'],
+    entry_points={
+        # The console script never imports tkinter, so cron and systemd runs
+        # start fast and work on machines without a display
+        'console_scripts': ['file-organizer=organizer_cli:main'],
+        'gui_scripts': ['file-organizer-gui=file_organizer:main'],
+    },
     data_files=DATA_FILES,
-    options={'py2app': OPTIONS},
-    setup_requires=['py2app'],
+    **APP_OPTIONS,
 )
\ No newline at end of file